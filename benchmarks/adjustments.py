@@ -0,0 +1,86 @@
+import asyncio
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from aiogram.types import Update, Message, Chat, Document
+
+from benchmarks.load import LoadTest, ADMIN_ID, message_update, user, _ids
+
+TEAMS = 300
+
+
+def document_update(user_id: int, caption: str, file_id: str, size: int) -> Update:
+    document = Document(file_id=file_id, file_unique_id=file_id, file_name=file_id, file_size=size)
+    message = Message(message_id=next(_ids), date=datetime.now(), chat=Chat(id=user_id, type="private"),
+                      from_user=user(user_id), caption=caption, document=document)
+    return Update(update_id=next(_ids), message=message)
+
+
+class AdjustmentsTest(LoadTest):
+    # Penalties and bonuses for many teams: one /multiply per asset against one batch, as text and as CSV
+
+    def __init__(self, workdir: str):
+        super().__init__(TEAMS, workdir)
+        self.session.latency = 0
+
+    async def register(self) -> None:
+        qrs = [f"a{i:06x}" for i in range(self.teams)]
+        await self.instance.db.add_qrcodes(qrs)
+        await self.phase("/start", [[message_update(o, f"/start {qr}")] for o, qr in zip(self.owner_ids, qrs)])
+
+    def assets(self) -> dict[str, tuple[float, float]]:
+        return {team.id: (team.asset_1, team.asset_2) for team in self.instance.teams}
+
+    def lines(self, size: int, factor: float) -> list[str]:
+        teams = list(self.instance.teams)[:size]
+        return [f"{team.id} {i % 2 + 1} {factor}" for i, team in enumerate(teams)]
+
+    async def measure(self, updates: list[Update]) -> tuple[float, int, int]:
+        commits, replies = self.commits, self.session.calls["SendMessage"]
+        start = time.perf_counter()
+        for update in updates:
+            await self.feed("/multiply", update)
+        return time.perf_counter() - start, self.commits - commits, self.session.calls["SendMessage"] - replies
+
+    async def run_size(self, size: int) -> None:
+        before = self.assets()
+        single = await self.measure([message_update(ADMIN_ID, f"/multiply {line}") for line in self.lines(size, 2)])
+        after_single = self.assets()
+        batch = await self.measure([message_update(ADMIN_ID, "/multiply\n" + "\n".join(self.lines(size, 0.5)))])
+        assert self.assets() == before, "batch did not undo the single commands"
+        # As spreadsheets export it, with a space after the delimiter
+        csv = "team_id, asset, factor\n" + "\n".join(line.replace(" ", ", ") for line in self.lines(size, 2))
+        self.session.files["adjust.csv"] = csv.encode()
+        upload = await self.measure([document_update(ADMIN_ID, "/multiply", "adjust.csv", len(csv))])
+        assert self.assets() == after_single, "CSV differs from the single commands"
+
+        # A bad line anywhere rejects the whole batch
+        lines = self.lines(size, 3)
+        lines[len(lines) // 2] = "nosuch 1 3"
+        snapshot = self.assets()
+        rejected = await self.measure([message_update(ADMIN_ID, "/multiply\n" + "\n".join(lines))])
+        assert self.assets() == snapshot and rejected[1] == 0, "rejected batch changed the state"
+        # Undo the CSV, the next size starts from the registered assets
+        await self.measure([message_update(ADMIN_ID, "/multiply\n" + "\n".join(self.lines(size, 0.5)))])
+
+        for mode, (elapsed, commits, replies) in (("single", single), ("batch", batch), ("csv", upload), ("rejected", rejected)):
+            print(f"{size:>6} {mode:>9} {elapsed * 1000:>10.1f} {commits:>8} {replies:>8}")
+
+
+async def main(sizes: list[int]):
+    print(f"{'lines':>6} {'mode':>9} {'time, ms':>10} {'commits':>8} {'replies':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        test = AdjustmentsTest(workdir)
+        await test.setup()
+        try:
+            await test.register()
+            for size in sizes:
+                await test.run_size(size)
+        finally:
+            await test.teardown()
+    print("OK")
+
+if __name__ == "__main__":
+    asyncio.run(main(list(map(int, sys.argv[1:])) or [1, 20, 300]))
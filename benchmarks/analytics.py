@@ -0,0 +1,97 @@
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("TELEGRAM_TOKEN", "42:LOAD-TEST")
+os.environ.setdefault("ADMIN_IDS", "1")
+
+from src.config import ROUNDS
+from src.db import Database
+from src.journal import team_registered, round_settled, phase_changed
+from src.models import Game, Team
+from src.bot import render_positions
+
+TEAMS = 300
+RENDERS = 1_000
+
+
+async def play_game(path: str, rnd: random.Random) -> Game:
+    # A finished game: registrations and every round settled, as /stop writes them
+    db = Database(path)
+    await db.connect()
+    game = Game()
+    teams = [Team(f"{i:06x}", f"Team #{i}", i) for i in range(TEAMS)]
+    db.track(game, lambda: teams)
+    db.append(*map(team_registered, teams))
+    for round_id, positions in enumerate(ROUNDS, 1):
+        game.round = round_id
+        round_results = []
+        for position in positions:
+            invests, coefficient = rnd.randrange(TEAMS), round(rnd.uniform(0.3, 4), 2)
+            game.history.setdefault(position.id, {})[str(round_id)] = (invests, coefficient)
+            round_results.append((round_id, position.id, invests, coefficient, invests * 10.0))
+        await db.write(round_settled(game, teams), phase_changed(game), round_results=round_results)
+    db.track(None, None)
+    await db.close()
+    return game
+
+async def stats_from_journal(paths: list[str]) -> dict[str, int]:
+    # Without the table every journal has to be replayed into memory
+    invests = {}
+    for path in paths:
+        db = Database(path)
+        await db.connect()
+        game = Game()
+        await db.load_state(game)
+        await db.close()
+        for pos_id, rounds in game.history.items():
+            invests[pos_id] = invests.get(pos_id, 0) + sum(data[0] for data in rounds.values())
+    return invests
+
+async def stats_from_table(paths: list[str]) -> dict[str, int]:
+    invests = {}
+    for path in paths:
+        db = Database(path)
+        await db.connect()
+        for pos_id, _, count, *_ in await db.position_stats():
+            invests[pos_id] = invests.get(pos_id, 0) + count
+        await db.close()
+    return invests
+
+async def main(sizes: list[int]):
+    rnd = random.Random(0)
+    with tempfile.TemporaryDirectory() as workdir:
+        game = await play_game(os.path.join(workdir, "render.db"), rnd)
+        start = time.perf_counter()
+        for _ in range(RENDERS):
+            render_positions(game.history)
+        rendered = (time.perf_counter() - start) / RENDERS * 1e6
+        cache = {}
+        start = time.perf_counter()
+        for _ in range(RENDERS):
+            if "stat" not in cache:
+                cache["stat"] = render_positions(game.history)
+        cached = (time.perf_counter() - start) / RENDERS * 1e6
+        print(f"/stat companies: rendered {rendered:.1f} us, cached {cached:.2f} us\n")
+
+        print(f"{'games':>6} {'journal replay, ms':>19} {'round_results, ms':>18}")
+        paths = []
+        for size in sizes:
+            while len(paths) < size:
+                paths.append(os.path.join(workdir, f"g{len(paths)}.db"))
+                await play_game(paths[-1], rnd)
+            start = time.perf_counter()
+            replayed = await stats_from_journal(paths)
+            journal = time.perf_counter() - start
+            start = time.perf_counter()
+            queried = await stats_from_table(paths)
+            table = time.perf_counter() - start
+            assert replayed == queried, "analytics differ from the journal"
+            print(f"{size:>6} {journal * 1000:>19.1f} {table * 1000:>18.1f}")
+    print("OK")
+
+if __name__ == "__main__":
+    asyncio.run(main(list(map(int, sys.argv[1:])) or [1, 10, 50]))
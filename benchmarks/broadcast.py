@@ -0,0 +1,57 @@
+import asyncio
+import random
+import sys
+import time
+from collections import deque
+
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError
+from aiogram.methods import SendMessage
+
+from src.broadcast import Broadcaster
+
+
+class FakeBot:
+    # Answers with 429 once more than `limit` messages were sent during the last second
+
+    def __init__(self, limit: int = 30, latency: float = 0.05, blocked: set[int] = frozenset()):
+        self.limit = limit
+        self.latency = latency
+        self.blocked = blocked
+        self.sent: deque[float] = deque()
+        self.delivered: set[int] = set()
+        self.flood_errors = 0
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        await asyncio.sleep(self.latency)
+        method = SendMessage(chat_id=chat_id, text=text)
+        if chat_id in self.blocked:
+            raise TelegramForbiddenError(method, "Forbidden: bot was blocked by the user")
+        now = time.monotonic()
+        while self.sent and now - self.sent[0] > 1:
+            self.sent.popleft()
+        if len(self.sent) >= self.limit:
+            self.flood_errors += 1
+            raise TelegramRetryAfter(method, "Too Many Requests", 1)
+        self.sent.append(now)
+        self.delivered.add(chat_id)
+
+
+async def naive_broadcast(bot: FakeBot, chat_ids: list[int]) -> int:
+    results = await asyncio.gather(*(bot.send_message(chat_id, "text") for chat_id in chat_ids), return_exceptions=True)
+    return sum(not isinstance(result, Exception) for result in results)
+
+async def main(sizes: list[int]):
+    print(f"{'teams':>6} {'naive delivered':>16} {'delivered':>10} {'failed':>7} {'429s':>5} {'time, s':>8}")
+    for size in sizes:
+        chat_ids = list(range(size))
+        blocked = set(random.Random(size).sample(chat_ids, size // 50))
+        naive = await naive_broadcast(FakeBot(blocked=blocked), chat_ids)
+        bot = FakeBot(blocked=blocked)
+        start = time.perf_counter()
+        report = await Broadcaster(bot).broadcast(chat_ids, "text")
+        elapsed = time.perf_counter() - start
+        assert bot.delivered == set(chat_ids) - blocked
+        print(f"{size:>6} {naive:>16} {report.delivered:>10} {report.failed:>7} {bot.flood_errors:>5} {elapsed:>8.2f}")
+
+if __name__ == "__main__":
+    asyncio.run(main(list(map(int, sys.argv[1:])) or [50, 300]))
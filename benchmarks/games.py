@@ -0,0 +1,107 @@
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+from aiogram.types import Update
+
+from benchmarks.load import FakeSession, FakeGspreadManager, TELEGRAM_RATE, message_update, callback_update
+from src.broadcast import Broadcaster
+from src.config import ROUNDS
+from src.games import GameInstance
+from src.models import GameConfig
+import src.bot as app
+
+ADMIN_BASE = 10 ** 9
+OWNER_BASE = 10 ** 10
+
+
+class MultiGameTest:
+    # Several games run the same scenario at once in one process, sharing the bot, the broadcaster and the Sheets client
+
+    def __init__(self, games: int, teams: int, workdir: str):
+        self.games = games
+        self.teams = teams
+        self.workdir = workdir
+        self.session = FakeSession()
+        self.agcm = FakeGspreadManager()
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.instances: list[GameInstance] = []
+        self.memory = 0.0 # bytes per game
+
+    async def setup(self) -> None:
+        app.bot.session = self.session
+        app.broadcaster = Broadcaster(app.bot, rate=TELEGRAM_RATE)
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(self.games):
+            config = GameConfig(f"g{i}", [ADMIN_BASE + i], "https://sheets.invalid", os.path.join(self.workdir, f"g{i}.db"), ROUNDS)
+            instance = GameInstance(config)
+            await instance.open(lambda: self.agcm, sheets_debounce=0.5)
+            app.games.add(instance)
+            self.instances.append(instance)
+        self.memory = (tracemalloc.get_traced_memory()[0] - before) / self.games
+        tracemalloc.stop()
+
+    async def teardown(self) -> None:
+        await app.broadcaster.join()
+        for instance in self.instances:
+            app.games.remove(instance)
+            await instance.close()
+
+    async def feed(self, operation: str, update: Update) -> None:
+        start = time.perf_counter()
+        await app.dp.feed_update(app.bot, update)
+        self.latencies[operation].append(time.perf_counter() - start)
+
+    async def play(self, index: int, instance: GameInstance) -> None:
+        admin_id = ADMIN_BASE + index
+        owner_ids = [OWNER_BASE + index * 1_000_000 + i for i in range(self.teams)]
+        qrs = [f"{index:x}q{i:06x}" for i in range(self.teams)]
+        await instance.db.add_qrcodes(qrs)
+        await asyncio.gather(*(self.feed("/start", message_update(o, f"/start {instance.id}-{qr}")) for o, qr in zip(owner_ids, qrs)))
+        await self.feed("/next", message_update(admin_id, "/next"))
+        positions = ROUNDS[0]
+        await asyncio.gather(*(
+            self.feed("invest", callback_update(o, f"invest:1:{positions[(o + asset) % len(positions)].id}:{asset}"))
+            for o in owner_ids for asset in (1, 2)
+        ))
+        await self.feed("/stop", message_update(admin_id, "/stop"))
+
+    async def run(self) -> None:
+        await asyncio.gather(*(self.play(i, instance) for i, instance in enumerate(self.instances)))
+
+    def check(self) -> None:
+        # Every game only holds its own teams and settled only its own round
+        for i, instance in enumerate(self.instances):
+            assert len(instance.teams) == self.teams, f"{instance.id}: {len(instance.teams)} teams"
+            assert all(team.owner_id // 1_000_000 == OWNER_BASE // 1_000_000 + i for team in instance.teams), f"{instance.id}: foreign team"
+            assert all(app.games.by_owner(team.owner_id) is instance for team in instance.teams), f"{instance.id}: owner index"
+            assert instance.game.round == 1 and not instance.game.started, f"{instance.id}: round not settled"
+            assert all(rounds.keys() == {"1"} for rounds in instance.game.history.values()), f"{instance.id}: history"
+
+async def main(sizes: list[int], teams: int):
+    print(f"{'games':>6} {'teams':>6} {'memory/game, KB':>16} {'invest p50, ms':>15} {'/stop p50, ms':>14} {'total, s':>9}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            test = MultiGameTest(size, teams, workdir)
+            await test.setup()
+            start = time.perf_counter()
+            try:
+                await test.run()
+                test.check()
+            finally:
+                await test.teardown()
+            total = time.perf_counter() - start
+        print(
+            f"{size:>6} {teams:>6} {test.memory / 1024:>16.1f} {statistics.median(test.latencies['invest']) * 1000:>15.1f}"
+            f" {statistics.median(test.latencies['/stop']) * 1000:>14.1f} {total:>9.2f}"
+        )
+    print("OK")
+
+if __name__ == "__main__":
+    asyncio.run(main(list(map(int, sys.argv[1:])) or [1, 5, 20], 50))
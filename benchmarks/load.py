@@ -0,0 +1,227 @@
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from itertools import count
+
+os.environ.setdefault("TELEGRAM_TOKEN", "42:LOAD-TEST")
+os.environ.setdefault("ADMIN_IDS", "1")
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Update, Message, CallbackQuery, Chat, User, File
+
+import src.bot as app
+from src.broadcast import Broadcaster
+from src.config import ADMIN_IDS, ROUNDS, QUIZ_QUESTIONS
+from src.games import GameInstance
+from src.metrics import TelegramMetricsMiddleware
+from src.models import GameConfig
+
+API_LATENCY = 0.02 # seconds per fake Telegram call
+SHEETS_LATENCY = 0.1 # seconds per fake Sheets call
+TELEGRAM_RATE = 1000 # broadcaster rate, the real default (25/s) makes large runs last minutes
+
+ADMIN_ID = ADMIN_IDS[0]
+_ids = count(1)
+
+
+class FakeSession(BaseSession):
+    # Answers every API call after a fixed delay and records it by method name
+
+    def __init__(self, latency: float = API_LATENCY):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self.requests: list[TelegramMethod] = []
+        self.files: dict[str, bytes] = {} # file_id: content, served by getFile and the file download
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int | None = None):
+        await asyncio.sleep(self.latency)
+        self.calls[type(method).__name__] += 1
+        self.requests.append(method)
+        returning = method.__returning__
+        if returning is bool or getattr(returning, "__args__", None):
+            return True
+        if returning is User:
+            return User(id=bot.id, is_bot=True, first_name="Margin", username="margin_bot")
+        if returning is File:
+            return File(file_id=method.file_id, file_unique_id=method.file_id, file_path=method.file_id)
+        return Message(message_id=next(_ids), date=datetime.now(), chat=Chat(id=getattr(method, "chat_id", 0), type="private"))
+
+    async def stream_content(self, url: str, *args, **kwargs):
+        yield self.files[url.rpartition("/")[2]]
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeWorksheet:
+
+    def __init__(self, manager: "FakeGspreadManager"):
+        self.manager = manager
+
+    async def _call(self, name: str) -> None:
+        await asyncio.sleep(self.manager.latency)
+        self.manager.calls[name] += 1
+
+    async def clear(self):
+        await self._call("clear")
+
+    async def batch_update(self, ranges):
+        await self._call("batch_update")
+
+    async def update_cells(self, cells):
+        await self._call("update_cells")
+
+
+class FakeGspreadManager:
+    # In-memory stand-in for AsyncioGspreadClientManager, a single object plays client and spreadsheet
+
+    def __init__(self, latency: float = SHEETS_LATENCY):
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+
+    async def authorize(self):
+        self.calls["authorize"] += 1
+        return self
+
+    async def open_by_url(self, url: str):
+        self.calls["open_by_url"] += 1
+        return self
+
+    async def get_worksheet(self, index: int):
+        self.calls["get_worksheet"] += 1
+        return FakeWorksheet(self)
+
+
+def user(user_id: int) -> User:
+    return User(id=user_id, is_bot=False, first_name=f"User {user_id}")
+
+def message_update(user_id: int, text: str) -> Update:
+    message = Message(message_id=next(_ids), date=datetime.now(), chat=Chat(id=user_id, type="private"), from_user=user(user_id), text=text)
+    return Update(update_id=next(_ids), message=message)
+
+def callback_update(user_id: int, data: str) -> Update:
+    message = Message(message_id=next(_ids), date=datetime.now(), chat=Chat(id=user_id, type="private"), text="Раунд")
+    query = CallbackQuery(id=str(next(_ids)), from_user=user(user_id), chat_instance="load", data=data, message=message)
+    return Update(update_id=next(_ids), callback_query=query)
+
+
+class LoadTest:
+
+    def __init__(self, teams: int, workdir: str):
+        self.teams = teams
+        self.workdir = workdir
+        self.session = FakeSession()
+        self.agcm = FakeGspreadManager()
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.api_calls: Counter[str] = Counter() # operation: API calls
+        self.commits = 0
+        self.rnd = random.Random(teams)
+        self.owner_ids = [ADMIN_ID + 1_000_000 * teams + i for i in range(1, teams + 1)]
+
+    async def setup(self) -> None:
+        app.bot.session = self.session
+        self.session.middleware(TelegramMetricsMiddleware())
+        app.broadcaster = Broadcaster(app.bot, rate=TELEGRAM_RATE)
+        config = GameConfig("load", [ADMIN_ID], "https://sheets.invalid", os.path.join(self.workdir, f"load_{self.teams}.db"), ROUNDS)
+        self.instance = GameInstance(config)
+        await self.instance.open(lambda: self.agcm, sheets_debounce=0.5)
+        commit = self.instance.db.conn.commit
+        async def counting_commit():
+            self.commits += 1
+            await commit()
+        self.instance.db.conn.commit = counting_commit
+        app.games.add(self.instance)
+
+    async def teardown(self) -> None:
+        await app.broadcaster.join()
+        app.games.remove(self.instance)
+        await self.instance.close()
+
+    async def feed(self, operation: str, update: Update) -> None:
+        start = time.perf_counter()
+        await app.dp.feed_update(app.bot, update)
+        self.latencies[operation].append(time.perf_counter() - start)
+
+    async def phase(self, operation: str, updates: list[list[Update]]) -> None:
+        # Every inner list is fed in order, the lists run concurrently as independent users
+        calls = sum(self.session.calls.values())
+        async def user_flow(flow: list[Update]):
+            for update in flow:
+                await self.feed(operation, update)
+        await asyncio.gather(*(user_flow(flow) for flow in updates))
+        self.api_calls[operation] += sum(self.session.calls.values()) - calls
+
+    async def admin(self, text: str) -> None:
+        await self.phase(text.split()[0], [[message_update(ADMIN_ID, text)]])
+
+    async def run(self) -> None:
+        qrs = [f"{self.teams:x}{i:06x}" for i in range(self.teams)]
+        await self.instance.db.add_qrcodes(qrs)
+        await self.phase("/start", [[message_update(owner_id, f"/start {qr}")] for owner_id, qr in zip(self.owner_ids, qrs)])
+        await self.phase("name", [[message_update(owner_id, f"Команда {owner_id}")] for owner_id in self.owner_ids])
+
+        commits = self.commits
+        await self.admin("/next")
+        positions = ROUNDS[self.instance.game.round - 1]
+        flows = []
+        for owner_id in self.owner_ids:
+            choice_1, choice_2 = self.rnd.choice(positions).id, self.rnd.choice(positions).id
+            flows.append([
+                callback_update(owner_id, f"invest:{self.instance.game.round}:{choice_1}:1"),
+                callback_update(owner_id, f"invest:{self.instance.game.round}:{choice_2}:2"),
+                callback_update(owner_id, f"invest:{self.instance.game.round}:{choice_1}:1") # repeated tap
+            ])
+        await self.phase("invest", flows)
+        await asyncio.sleep(self.instance.db.flush_interval * 2)
+        start = time.perf_counter()
+        await self.admin("/stop")
+        await app.broadcaster.join()
+        self.results_delivered = time.perf_counter() - start
+        self.round_commits = self.commits - commits
+
+        await self.admin("/start_quiz")
+        await self.phase("quiz", [
+            [message_update(owner_id, self.rnd.choice(answers)) for _, answers in QUIZ_QUESTIONS]
+            for owner_id in self.owner_ids
+        ])
+        await self.admin("/end_quiz")
+        await self.admin("/quiz_results")
+        await self.admin("/stat")
+        await self.admin("/analytics")
+        await self.admin("/metrics")
+
+    def report(self) -> None:
+        print(f"\n{self.teams} teams")
+        print(f"{'operation':>14} {'count':>7} {'p50, ms':>9} {'p99, ms':>9} {'max, ms':>9} {'API/op':>7}")
+        for operation, latencies in self.latencies.items():
+            latencies = sorted(latencies)
+            p50 = statistics.median(latencies) * 1000
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+            print(f"{operation:>14} {len(latencies):>7} {p50:>9.1f} {p99:>9.1f} {latencies[-1] * 1000:>9.1f} {self.api_calls[operation] / len(latencies):>7.2f}")
+        print(f"SQLite commits per round (/next..stop): {self.round_commits}, total: {self.commits}")
+        print(f"/stop reply: {self.latencies['/stop'][0]:.3f} s, round results delivered: {self.results_delivered:.3f} s")
+        print(f"Telegram calls: {dict(self.session.calls)}")
+        print(f"Sheets calls: {dict(self.agcm.calls)}")
+
+async def main(sizes: list[int]):
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            test = LoadTest(size, workdir)
+            await test.setup()
+            try:
+                await test.run()
+            finally:
+                await test.teardown()
+            test.report()
+
+if __name__ == "__main__":
+    asyncio.run(main(list(map(int, sys.argv[1:])) or [100, 300]))
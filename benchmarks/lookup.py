@@ -0,0 +1,48 @@
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("ADMIN_IDS", "0")
+
+from src.config import ALL_POSITIONS, POSITIONS_BY_ID
+from src.models import Team
+from src.registry import TeamRegistry
+
+LOOKUPS = 10_000
+
+
+def make_teams(count: int) -> list[Team]:
+    return [Team(f"{i:06x}", f"Team #{i}", i) for i in range(count)]
+
+def legacy_team_by_id(teams: dict[int, Team], team_id: str) -> Team | None:
+    return next(filter(lambda team: team.id == team_id.lower(), teams.values()), None)
+
+def legacy_pos_by_id(pos_id: str):
+    return next(filter(lambda p: p.id == pos_id, ALL_POSITIONS))
+
+def measure(func, keys: list) -> float:
+    # Cost of a single lookup in microseconds
+    start = time.perf_counter()
+    for key in keys:
+        func(key)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+def main(sizes: list[int]):
+    rnd = random.Random(0)
+    pos_ids = [rnd.choice(ALL_POSITIONS).id for _ in range(LOOKUPS)]
+    legacy_pos = measure(legacy_pos_by_id, pos_ids)
+    indexed_pos = measure(POSITIONS_BY_ID.__getitem__, pos_ids)
+    print(f"position lookup: legacy {legacy_pos:.3f} us, indexed {indexed_pos:.3f} us\n")
+    print(f"{'teams':>8} {'legacy, us':>12} {'indexed, us':>12}")
+    for size in sizes:
+        teams = make_teams(size)
+        user_teams = {team.owner_id: team for team in teams}
+        registry = TeamRegistry(teams)
+        team_ids = [rnd.choice(teams).id for _ in range(min(LOOKUPS, 10_000_000 // size))]
+        legacy = measure(lambda team_id: legacy_team_by_id(user_teams, team_id), team_ids)
+        indexed = measure(registry.by_id, team_ids)
+        print(f"{size:>8} {legacy:>12.3f} {indexed:>12.3f}")
+
+if __name__ == "__main__":
+    main(list(map(int, sys.argv[1:])) or [100, 1_000, 10_000])
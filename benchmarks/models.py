@@ -0,0 +1,77 @@
+import os
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from operator import add
+
+os.environ.setdefault("ADMIN_IDS", "0")
+
+from src.config import ROUNDS
+from src.models import Team
+from src.table import TeamTable
+
+
+@dataclass
+class LegacyTeam:
+    id: str
+    name: str
+    owner_id: int
+    asset_1: float = 10
+    asset_2: float = 10
+    choice_1: str | None = None
+    choice_2: str | None = None
+
+    quiz_answers: list[str] = field(default_factory=list)
+
+    @property
+    def total_score(self):
+        return self.asset_1 + self.asset_2
+
+
+def make_teams(cls, count: int) -> list:
+    rnd = random.Random(count)
+    positions = ROUNDS[3]
+    return [
+        cls(f"{i:06x}", f"Team #{i}", i, rnd.uniform(1, 100), rnd.uniform(1, 100), rnd.choice(positions).id, rnd.choice(positions).id)
+        for i in range(count)
+    ]
+
+def measure_memory(func, *args) -> tuple[object, int]:
+    tracemalloc.start()
+    result = func(*args)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+def measure(func, *args, repeat: int = 20) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    return (time.perf_counter() - start) / repeat
+
+def legacy_ranking(teams: list) -> list:
+    return sorted(teams, key=lambda x: x.total_score, reverse=True)
+
+def table_ranking(table: TeamTable) -> list[int]:
+    # Row indices ordered by total score, ties keep the original order
+    totals = list(map(add, table.asset_1, table.asset_2))
+    return sorted(range(len(totals)), key=totals.__getitem__, reverse=True)
+
+def main(size: int):
+    legacy_teams, legacy_memory = measure_memory(make_teams, LegacyTeam, size)
+    teams, memory = measure_memory(make_teams, Team, size)
+    table, table_memory = measure_memory(TeamTable, teams)
+    print(f"{size} teams, memory:")
+    print(f"  dict dataclass {legacy_memory / 1024:>10.0f} KiB")
+    print(f"  slots dataclass {memory / 1024:>9.0f} KiB")
+    print(f"  TeamTable view {table_memory / 1024:>10.0f} KiB")
+    assert [team.id for team in legacy_ranking(legacy_teams)] == [teams[i].id for i in table_ranking(table)]
+    print(f"{size} teams, ranking time:")
+    print(f"  sorted(objects) {measure(legacy_ranking, legacy_teams) * 1000:>9.2f} ms")
+    print(f"  TeamTable ranking {measure(table_ranking, table) * 1000:>7.2f} ms")
+    print(f"  build + ranking {measure(lambda: table_ranking(TeamTable(teams))) * 1000:>9.2f} ms")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
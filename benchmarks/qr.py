@@ -0,0 +1,56 @@
+import asyncio
+import io
+import sys
+import time
+import zipfile
+
+from PIL import Image
+from qrcode import ERROR_CORRECT_L
+from qrcode.main import QRCode
+
+from src.qr import QrRenderer
+
+
+def legacy_render(codes: dict[str, str]) -> bytes:
+    file = io.BytesIO()
+    with zipfile.ZipFile(file, "w") as zf:
+        qr_template = Image.open("qr_template.png")
+        for name, link in codes.items():
+            qr_file = io.BytesIO()
+            qr_data = QRCode(error_correction=ERROR_CORRECT_L, box_size=10, border=0)
+            qr_data.add_data(link)
+            qr_data.make()
+            qr_code_img = qr_data.make_image(fill_color="white", back_color="#141414").resize((750, 750))
+            img = qr_template.copy()
+            img.paste(qr_code_img, (150, 650))
+            img.save(qr_file, format="PNG")
+            zf.writestr(f"{name}.jpeg", qr_file.getvalue())
+    return file.getvalue()
+
+async def pool_render(renderer: QrRenderer, codes: dict[str, str], image_format: str) -> tuple[int, int]:
+    archives, size = 0, 0
+    async for archive in renderer.render_archives(codes, image_format):
+        archives += 1
+        size += len(archive.read())
+    return archives, size
+
+async def main(sizes: list[int]):
+    renderer = QrRenderer()
+    await pool_render(renderer, {"warmup": "warmup"}, "png") # start the workers before measuring
+    print(f"{'codes':>6} {'legacy, s':>10} {'png, s':>8} {'jpeg, s':>8} {'jpeg archives':>14} {'jpeg MB':>8}")
+    for size in sizes:
+        codes = {f"{i:06x}": f"https://t.me/margin_game_bot?start={i:06x}" for i in range(size)}
+        start = time.perf_counter()
+        legacy_render(codes)
+        legacy = time.perf_counter() - start
+        start = time.perf_counter()
+        await pool_render(renderer, codes, "png")
+        png = time.perf_counter() - start
+        start = time.perf_counter()
+        archives, jpeg_size = await pool_render(renderer, codes, "jpeg")
+        jpeg = time.perf_counter() - start
+        print(f"{size:>6} {legacy:>10.2f} {png:>8.2f} {jpeg:>8.2f} {archives:>14} {jpeg_size / 2**20:>8.1f}")
+    renderer.close()
+
+if __name__ == "__main__":
+    asyncio.run(main(list(map(int, sys.argv[1:])) or [100, 1_000]))
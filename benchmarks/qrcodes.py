@@ -0,0 +1,66 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("ADMIN_IDS", "0")
+
+from src.db import Database
+
+SCANS = 2_000
+
+
+async def legacy_claim(db: Database, qr_id: str) -> bool:
+    # SELECT, check in Python, then UPDATE: two round trips with a gap between them
+    async with db.conn.execute("SELECT * FROM qrcodes WHERE id=?", (qr_id,)) as cur:
+        row = await cur.fetchone()
+    if not row or row[1]:
+        return False
+    await db.conn.execute("UPDATE qrcodes SET activated=1 WHERE id=?", (qr_id,))
+    await db.conn.commit()
+    return True
+
+async def claim(db: Database, qr_id: str) -> bool:
+    return db.qrcode_activated(qr_id) is False and await db.claim_qrcode(qr_id)
+
+async def measure(func, db: Database, qr_ids: list[str]) -> float:
+    # Microseconds per scan
+    start = time.perf_counter()
+    for qr_id in qr_ids:
+        await func(db, qr_id)
+    return (time.perf_counter() - start) / len(qr_ids) * 1e6
+
+async def race(func, db: Database, qr_id: str, scans: int) -> int:
+    # The same code scanned by several users at once, returns how many of them got it
+    return sum(await asyncio.gather(*(func(db, qr_id) for _ in range(scans))))
+
+async def main(sizes: list[int]):
+    print(f"{'codes':>8} {'issue, s':>9} {'legacy, us':>11} {'claim, us':>10} {'legacy bad, us':>15} {'bad scan, us':>13} {'race winners':>13}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "db.sqlite")
+            db = Database(path)
+            await db.connect()
+            start = time.perf_counter()
+            qr_ids = await db.issue_qrcodes(size)
+            issued = time.perf_counter() - start
+            assert len(set(qr_ids)) == size
+            await db.close()
+
+            db = Database(path) # the codes are loaded from disk the way a restart sees them
+            await db.connect()
+            scans = min(SCANS, size // 4)
+            legacy = await measure(legacy_claim, db, qr_ids[:scans])
+            claimed = await measure(claim, db, qr_ids[scans:2 * scans])
+            bad_ids = [f"x{i:05x}" for i in range(scans)]
+            legacy_bad = await measure(legacy_claim, db, bad_ids)
+            bad = await measure(claim, db, bad_ids)
+            winners = await race(claim, db, qr_ids[2 * scans], 10), await race(legacy_claim, db, qr_ids[2 * scans + 1], 10)
+            assert winners[0] == 1, f"{winners[0]} users claimed the same code"
+            await db.close()
+        print(f"{size:>8} {issued:>9.2f} {legacy:>11.1f} {claimed:>10.1f} {legacy_bad:>15.1f} {bad:>13.2f} {f'{winners[0]} (legacy {winners[1]})':>13}")
+    print("OK")
+
+if __name__ == "__main__":
+    asyncio.run(main(list(map(int, sys.argv[1:])) or [1_000, 10_000, 50_000]))
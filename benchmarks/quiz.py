@@ -0,0 +1,42 @@
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("ADMIN_IDS", "0")
+
+from src.config import QUIZ_QUESTIONS
+from src.quiz import is_correct
+
+NOISE = ["", " ", "!", ".", "  ", "?!"]
+
+
+def make_answers(count: int) -> list[tuple[int, str]]:
+    # Accepted answers with random case and punctuation around them, plus wrong ones
+    rnd = random.Random(count)
+    answers = []
+    for _ in range(count):
+        question = rnd.randrange(len(QUIZ_QUESTIONS))
+        answer = rnd.choice(QUIZ_QUESTIONS[question][1] + ("apple", "акции"))
+        answer = "".join(char.upper() if rnd.random() < 0.3 else char for char in answer)
+        answers.append((question, rnd.choice(NOISE) + answer + rnd.choice(NOISE)))
+    return answers
+
+def legacy_is_correct(question: int, answer: str) -> bool:
+    return answer.lower() in list(map(str.lower, QUIZ_QUESTIONS[question][1]))
+
+def measure(func, answers: list[tuple[int, str]]) -> tuple[float, int]:
+    start = time.perf_counter()
+    correct = sum(func(question, answer) for question, answer in answers)
+    return time.perf_counter() - start, correct
+
+def main(sizes: list[int]):
+    print(f"{'answers':>8} {'legacy, ms':>11} {'correct':>8} {'matcher, ms':>12} {'correct':>8}")
+    for size in sizes:
+        answers = make_answers(size)
+        legacy, legacy_correct = measure(legacy_is_correct, answers)
+        matcher, correct = measure(is_correct, answers)
+        print(f"{size:>8} {legacy * 1000:>11.2f} {legacy_correct:>8} {matcher * 1000:>12.2f} {correct:>8}")
+
+if __name__ == "__main__":
+    main(list(map(int, sys.argv[1:])) or [1_000, 10_000, 100_000])
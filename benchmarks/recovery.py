@@ -0,0 +1,97 @@
+import asyncio
+import sys
+import tempfile
+import time
+
+from benchmarks.load import LoadTest, message_update, callback_update
+from src.config import ROUNDS, QUIZ_QUESTIONS
+from src.db import Database
+from src.models import Game
+
+
+class RecoveryTest(LoadTest):
+    # After every step the database file is opened by a second connection, which sees exactly what a crash
+    # at that moment would leave on disk, and the recovered state is compared with the live one
+
+    def __init__(self, teams: int, workdir: str, snapshot_every: int):
+        super().__init__(teams, workdir)
+        self.session.latency = 0
+        self.snapshot_every = snapshot_every
+        self.checks: list[tuple[str, float, int]] = [] # step, recovery time, lagging buffered fields
+
+    async def setup(self) -> None:
+        await super().setup()
+        self.instance.db.snapshot_every = self.snapshot_every
+
+    async def crash_and_recover(self, step: str) -> None:
+        db = Database(self.instance.db.path)
+        await db.connect()
+        game = Game()
+        start = time.perf_counter()
+        try:
+            teams = {team.id: team for team in await db.load_state(game)}
+        finally:
+            await db.close()
+        elapsed = time.perf_counter() - start
+        live = self.instance.game
+        assert (game.round, game.started, game.wait_for_coefficient, game.quiz_started) == \
+            (live.round, live.started, live.wait_for_coefficient, live.quiz_started), f"{step}: game phase lost"
+        assert game.history == {pos_id: {r: list(data) for r, data in rounds.items()} for pos_id, rounds in live.history.items()}, f"{step}: history lost"
+        assert teams.keys() == {team.id for team in self.instance.teams}, f"{step}: registrations lost"
+        lagging = 0
+        for team in self.instance.teams:
+            recovered = teams[team.id]
+            assert (recovered.asset_1, recovered.asset_2) == (team.asset_1, team.asset_2), f"{step}: assets of {team.id} lost"
+            # Choices, names and quiz answers are written by the periodic flush and may lag behind by one interval
+            lagging += sum(
+                getattr(recovered, name) != getattr(team, name)
+                for name in ("name", "choice_1", "choice_2", "quiz_answers")
+            )
+        self.checks.append((step, elapsed, lagging))
+
+    async def step(self, name: str, operation) -> None:
+        await operation
+        await self.crash_and_recover(name)
+
+    async def run(self) -> None:
+        qrs = [f"{self.teams:x}{i:06x}" for i in range(self.teams)]
+        await self.instance.db.add_qrcodes(qrs)
+        await self.step("register", self.phase("/start", [[message_update(o, f"/start {qr}")] for o, qr in zip(self.owner_ids, qrs)]))
+        await self.step("name", self.phase("name", [[message_update(o, f"Команда {o}")] for o in self.owner_ids]))
+        for round_id, positions in enumerate(ROUNDS, 1):
+            await self.step(f"/next {round_id}", self.admin("/next"))
+            await self.step(f"invest {round_id}", self.phase("invest", [
+                [callback_update(o, f"invest:{round_id}:{self.rnd.choice(positions).id}:{asset}") for asset in "1212"]
+                for o in self.owner_ids
+            ]))
+            if any(position.custom_coefficient for position in positions):
+                await self.step(f"/stop {round_id}", self.admin("/stop"))
+                await self.step(f"/stop {round_id} coefficient", self.admin("/stop 3"))
+            else:
+                await self.step(f"/stop {round_id}", self.admin("/stop"))
+            if round_id == 3:
+                await self.step("/start_quiz", self.admin("/start_quiz"))
+                await self.step("quiz", self.phase("quiz", [
+                    [message_update(o, self.rnd.choice(answers)) for _, answers in QUIZ_QUESTIONS] for o in self.owner_ids
+                ]))
+                await self.step("/end_quiz", self.admin("/end_quiz"))
+                await self.step("/quiz_results", self.admin("/quiz_results"))
+        await self.step("/multiply", self.admin(f"/multiply {next(iter(self.instance.teams)).id} 1 1.5"))
+
+async def main(teams: int, snapshot_intervals: list[int]):
+    for snapshot_every in snapshot_intervals:
+        with tempfile.TemporaryDirectory() as workdir:
+            test = RecoveryTest(teams, workdir, snapshot_every)
+            await test.setup()
+            try:
+                await test.run()
+            finally:
+                await test.teardown()
+        print(f"\n{teams} teams, snapshot every {snapshot_every} events")
+        print(f"{'crash after':>24} {'recovery, ms':>13} {'lagging fields':>15}")
+        for step, elapsed, lagging in test.checks:
+            print(f"{step:>24} {elapsed * 1000:>13.1f} {lagging:>15}")
+    print("OK")
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 300, list(map(int, sys.argv[2:])) or [1_000_000, 500]))
@@ -0,0 +1,110 @@
+import os
+import random
+import sys
+import time
+from collections import Counter
+from typing import Iterable, Mapping
+
+os.environ.setdefault("ADMIN_IDS", "0")
+
+from src.coefficients import TABLE_SIZE, round_coefficients
+from src.config import ROUNDS, ALL_POSITIONS
+from src.models import Team, RoundPosition
+from src.settlement import settle_round
+from src.table import POSITION_IDS
+
+COUNT_VECTORS = 10_000
+
+
+def make_teams(count: int, round_id: int) -> list[Team]:
+    rnd = random.Random(count)
+    positions = ROUNDS[round_id - 1]
+    return [
+        Team(f"{i:06x}", f"Team #{i}", i, choice_1=rnd.choice(positions).id, choice_2=rnd.choice(positions).id)
+        for i in range(count)
+    ]
+
+# The interpreter RoundPosition used to settle rounds with, kept as the reference for the compiled tables
+
+def legacy_coefficient(position: RoundPosition, counts: Mapping[str, int], custom_coefficient: float | None = None) -> float | None:
+    invests = counts.get(position.id, 0)
+    if position.linear_coefficient is not None:
+        return round(position.linear_coefficient(invests), 2)
+    if position.nonlinear_coefficients is not None:
+        for period, coefficient in position.nonlinear_coefficients.items():
+            if (invests >= period[0] and period[1] is None) or period[0] <= invests <= period[1]:
+                return coefficient
+    if position.coefficient_from_mother is not None:
+        if not invests:
+            return 1
+        return round((counts.get(position.coefficient_from_mother, 0) / invests) or 1, 2)
+    if position.custom_coefficient is not None:
+        return custom_coefficient
+    return None
+
+def legacy_counts(teams: Iterable[Team]) -> Counter[str]:
+    counts = Counter()
+    for team in teams:
+        if team.choice_1:
+            counts[team.choice_1] += 1
+        if team.choice_2:
+            counts[team.choice_2] += 1
+    return counts
+
+def legacy_invests_by_id(pos_id: str, teams: Iterable[Team]) -> int:
+    total = 0
+    for team in teams:
+        if team.choice_1 == pos_id:
+            total += 1
+        if team.choice_2 == pos_id:
+            total += 1
+    return total
+
+def legacy_settle(teams: list[Team], round_id: int) -> None:
+    # Every coefficient used to count the choices of all teams again
+    get_pos_by_id = lambda pos_id: next(filter(lambda p: p.id == pos_id, ALL_POSITIONS))
+    for team in teams:
+        if team.choice_1:
+            team.asset_1 *= round(legacy_coefficient(get_pos_by_id(team.choice_1), legacy_counts(list(teams))), 2)
+        if team.choice_2:
+            team.asset_2 *= round(legacy_coefficient(get_pos_by_id(team.choice_2), legacy_counts(list(teams))), 2)
+        team.asset_1, team.asset_2 = round(team.asset_1, 2), round(team.asset_2, 2)
+    for pos in ROUNDS[round_id - 1]:
+        legacy_invests_by_id(pos.id, teams), legacy_coefficient(pos, legacy_counts(teams))
+
+def check_coefficients() -> None:
+    # Compiled tables against the legacy interpreter on random counts, past the table size too
+    rnd = random.Random(0)
+    vectors = [[rnd.choice((0, rnd.randrange(TABLE_SIZE + 100), rnd.randrange(20))) for _ in POSITION_IDS] for _ in range(COUNT_VECTORS)]
+    interpreted = compiled = 0.0
+    for positions in ROUNDS:
+        for counts in vectors:
+            by_id = dict(zip(POSITION_IDS, counts))
+            start = time.perf_counter()
+            expected = [legacy_coefficient(position, by_id) for position in positions]
+            interpreted += time.perf_counter() - start
+            start = time.perf_counter()
+            actual = round_coefficients(positions, counts)
+            compiled += time.perf_counter() - start
+            assert actual == expected, f"{counts}: {actual} != {expected}"
+    calls = COUNT_VECTORS * len(ROUNDS)
+    print(f"round coefficients: interpreted {interpreted / calls * 1e6:.2f} us, compiled {compiled / calls * 1e6:.2f} us\n")
+
+def measure(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+def main(sizes: list[int]):
+    check_coefficients()
+    round_id = 4 # includes nonlinear and mother-derived positions
+    print(f"{'teams':>8} {'legacy, s':>12} {'engine, s':>12} {'speedup':>9}")
+    for size in sizes:
+        legacy_teams, engine_teams = make_teams(size, round_id), make_teams(size, round_id)
+        legacy = measure(legacy_settle, legacy_teams, round_id)
+        engine = measure(settle_round, engine_teams, ROUNDS[round_id - 1])
+        assert [(t.asset_1, t.asset_2) for t in legacy_teams] == [(t.asset_1, t.asset_2) for t in engine_teams]
+        print(f"{size:>8} {legacy:>12.4f} {engine:>12.4f} {legacy / engine:>8.0f}x")
+
+if __name__ == "__main__":
+    main(list(map(int, sys.argv[1:])) or [100, 1_000, 10_000])
@@ -0,0 +1,239 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+os.environ.setdefault("TELEGRAM_TOKEN", "42:LOAD-TEST")
+os.environ.setdefault("ADMIN_IDS", "1")
+
+from aiohttp import web
+from google.auth.credentials import AnonymousCredentials
+from gspread.utils import a1_range_to_grid_range
+from gspread_asyncio import AsyncioGspreadClientManager
+from requests.adapters import HTTPAdapter
+
+from src.models import Team
+from src.sheets import SheetsSync, leaderboard_rows, position_cells
+from src.sheets_client import SheetsClientManager
+
+API_URL = "https://sheets.googleapis.com"
+SHEET_TITLES = ("Рейтинг", "Компании")
+TEAMS = 50
+UPDATES = 5 # leaderboard changes per game
+OUTAGE = 4.0 # seconds of 503 in the outage scenario
+
+
+class StubSheetsServer:
+    # Local stand-in for the Sheets API v4 endpoints gspread uses here: metadata, values clear, batchUpdate and update.
+    # Values are kept per spreadsheet, so the final state can be compared with what the games wanted to write
+
+    def __init__(self, fail_rate: float = 0.0, seed: int = 0):
+        self.fail_rate = fail_rate
+        self.rnd = random.Random(seed)
+        self.down_until = 0.0
+        self.values: dict[tuple[str, str], dict[tuple[int, int], str]] = {} # spreadsheet id, sheet title: cell: value
+        self.calls: Counter[str] = Counter()
+        self.times: list[float] = []
+        self.url = ""
+        self._runner: web.AppRunner | None = None
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    async def close(self) -> None:
+        await self._runner.cleanup()
+
+    def sheet(self, spreadsheet_id: str, title: str) -> list[list[str]]:
+        cells = self.values.get((spreadsheet_id, title), {})
+        rows = max((row for row, _ in cells), default=0)
+        cols = max((col for _, col in cells), default=0)
+        grid = [[cells.get((row, col), "") for col in range(1, cols + 1)] for row in range(1, rows + 1)]
+        while grid and not any(grid[-1]):
+            grid.pop()
+        return grid
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.times.append(time.monotonic())
+        _, _, spreadsheet_id, *rest = request.path.strip("/").split("/", 3)
+        rest = rest[0] if rest else ""
+        if time.monotonic() < self.down_until:
+            self.calls["503"] += 1
+            return web.json_response({"error": {"code": 503, "message": "Unavailable"}}, status=503)
+        if self.rnd.random() < self.fail_rate:
+            status = self.rnd.choice((429, 500, 503))
+            self.calls[str(status)] += 1
+            return web.json_response({"error": {"code": status, "message": "Injected"}}, status=status)
+        if request.method == "GET" and not rest:
+            self.calls["metadata"] += 1
+            return web.json_response({
+                "spreadsheetId": spreadsheet_id,
+                "properties": {"title": spreadsheet_id},
+                "sheets": [
+                    {"properties": {"sheetId": i, "title": title, "index": i, "gridProperties": {"rowCount": 1000, "columnCount": 40}}}
+                    for i, title in enumerate(SHEET_TITLES)
+                ]
+            })
+        body = json.loads(await request.read() or "{}")
+        ranges = [data["range"] for data in body.get("data", [])] or [rest.removeprefix("values/")]
+        if any(range_name.count("!") > 1 for range_name in ranges):
+            self.calls["400"] += 1
+            return web.json_response({"error": {"code": 400, "message": "Unable to parse range"}}, status=400)
+        if rest.endswith(":clear"):
+            self.calls["clear"] += 1
+            self.values.pop((spreadsheet_id, rest[len("values/"):-len(":clear")].strip("'")), None)
+        elif rest == "values:batchUpdate":
+            self.calls["batch_update"] += 1
+            for data in body["data"]:
+                self._write(spreadsheet_id, data["range"], data["values"])
+        elif request.method == "PUT":
+            self.calls["update"] += 1
+            self._write(spreadsheet_id, rest[len("values/"):], body["values"])
+        return web.json_response({"spreadsheetId": spreadsheet_id})
+
+    def _write(self, spreadsheet_id: str, range_name: str, values: list[list]) -> None:
+        title, _, cells = range_name.rpartition("!")
+        grid = a1_range_to_grid_range(cells)
+        sheet = self.values.setdefault((spreadsheet_id, title.strip("'")), {})
+        for i, row in enumerate(values):
+            for j, value in enumerate(row):
+                cell = (grid["startRowIndex"] + i + 1, grid["startColumnIndex"] + j + 1)
+                if value is None: # gaps of an update_cells rectangle are left as they are
+                    continue
+                if value == "":
+                    sheet.pop(cell, None)
+                else:
+                    sheet[cell] = str(value)
+
+
+class StubAdapter(HTTPAdapter):
+
+    def __init__(self, url: str):
+        super().__init__()
+        self.url = url
+
+    def send(self, request, **kwargs):
+        request.url = request.url.replace(API_URL, self.url, 1)
+        return super().send(request, **kwargs)
+
+def stub_client(manager_class: type[AsyncioGspreadClientManager], server: StubSheetsServer, **kwargs):
+    # The real gspread stack with its requests session pointed at the stub
+    class StubManager(manager_class):
+        async def authorize(self):
+            client = await super().authorize()
+            client.gc.http_client.session.mount(API_URL, StubAdapter(server.url))
+            return client
+    return StubManager(AnonymousCredentials, **kwargs)
+
+
+class StubGame:
+
+    def __init__(self, index: int, rnd: random.Random):
+        self.id = f"g{index}"
+        self.rnd = rnd
+        self.teams = [Team(f"{index:02x}{i:04x}", f"Team #{i}", i) for i in range(TEAMS)]
+        self.history: dict[str, dict[str, tuple]] = {}
+        self.sheets: SheetsSync | None = None
+
+    def ranked(self) -> list[Team]:
+        return sorted(self.teams, key=lambda team: -team.total_score)
+
+    def play_round(self, round_id: int) -> None:
+        for team in self.rnd.sample(self.teams, TEAMS // 5):
+            team.asset_1 = round(team.asset_1 * self.rnd.uniform(0.5, 2), 2)
+        self.history.setdefault("sibur", {})[str(round_id)] = (self.rnd.randrange(TEAMS), round(self.rnd.uniform(0.5, 3), 2))
+
+    def expected(self) -> tuple[list[list[str]], dict[tuple[int, int], str]]:
+        return [[str(value) for value in row] for row in leaderboard_rows(self.ranked())], position_cells(self.history)
+
+
+async def play(games: int, fail_rate: float, budget: int) -> None:
+    # The budget is per second here instead of per minute, to keep the run short
+    server = StubSheetsServer(fail_rate)
+    await server.start()
+    manager = stub_client(SheetsClientManager, server, budget=budget, budget_window=1, backoff=0.05, max_backoff=0.5)
+    rnd = random.Random(games)
+    instances = [StubGame(i, rnd) for i in range(games)]
+    flushes = Counter()
+    start = time.perf_counter()
+
+    async def run_game(game: StubGame) -> None:
+        game.sheets = SheetsSync(lambda: manager, f"https://docs.google.com/spreadsheets/d/{game.id}/edit",
+                                 game.ranked, lambda: position_cells(game.history), debounce=0.05)
+        for round_id in range(1, UPDATES + 1):
+            game.play_round(round_id)
+            game.sheets.mark_dirty(positions=True)
+            flushes[await game.sheets.flush()] += 1
+        while game.sheets.dirty:
+            flushes[await game.sheets.flush()] += 1
+
+    await asyncio.gather(*map(run_game, instances))
+    elapsed = time.perf_counter() - start
+    for game in instances:
+        leaderboard, cells = game.expected()
+        assert server.sheet(game.id, SHEET_TITLES[0]) == leaderboard, f"{game.id}: leaderboard differs"
+        written = server.values.get((game.id, SHEET_TITLES[1]), {})
+        assert written == cells, f"{game.id}: positions differ"
+    rate = max(sum(1 for t in server.times if s <= t < s + 1) for s in server.times)
+    assert rate <= budget, f"{rate} requests in a second, budget {budget}"
+    print(
+        f"{games:>6} {fail_rate:>6.0%} {len(server.times):>9} {server.calls['metadata'] / games:>13.1f}"
+        f" {sum(server.calls[s] for s in ('429', '500', '503')):>7} {flushes[False]:>14} {rate:>11} {budget:>8} {elapsed:>9.2f}"
+    )
+    await server.close()
+
+async def outage(manager_class: type[AsyncioGspreadClientManager], **kwargs) -> tuple[float, bool, float]:
+    # /stop used to await the flush: how long it waits once the API is down and whether the state catches up
+    server = StubSheetsServer()
+    await server.start()
+    manager = stub_client(manager_class, server, **kwargs)
+    game = StubGame(0, random.Random(0))
+    game.sheets = SheetsSync(lambda: manager, f"https://docs.google.com/spreadsheets/d/{game.id}/edit",
+                             game.ranked, lambda: position_cells(game.history), debounce=0.1)
+    game.sheets.mark_dirty()
+    await game.sheets.flush()
+    game.sheets.start()
+    server.down_until = time.monotonic() + OUTAGE
+    game.play_round(1)
+    game.sheets.mark_dirty(positions=True)
+    start = time.perf_counter()
+    flushed = await game.sheets.flush()
+    blocked = time.perf_counter() - start
+    # The worker retries on its own, a flush waits for the one in progress
+    while not await game.sheets.flush():
+        await asyncio.sleep(0.1)
+    caught_up = time.perf_counter() - start
+    leaderboard, cells = game.expected()
+    assert server.sheet(game.id, SHEET_TITLES[0]) == leaderboard, "leaderboard differs after the outage"
+    assert server.values.get((game.id, SHEET_TITLES[1]), {}) == cells, "positions differ after the outage"
+    await game.sheets.close()
+    await server.close()
+    return blocked, flushed, caught_up
+
+async def main(sizes: list[int]):
+    # Every injected error is logged as a retry, only the results are printed
+    logging.disable(logging.CRITICAL)
+    print(f"{'games':>6} {'errors':>6} {'requests':>9} {'metadata/game':>13} {'failed':>7} {'failed flushes':>14} {'max req/s':>11} {'budget/s':>8} {'total, s':>9}")
+    for size in sizes:
+        await play(size, 0.0, 100)
+        await play(size, 0.2, 100)
+    await play(sizes[-1], 0.0, 20)
+
+    print(f"\nSheets API down for {OUTAGE:.0f} s during a flush:")
+    blocked, flushed, caught_up = await outage(AsyncioGspreadClientManager, gspread_delay=0.1)
+    print(f"  gspread_asyncio retry forever: flush blocked {blocked:.2f} s, written {flushed}, synced after {caught_up:.2f} s")
+    blocked, flushed, caught_up = await outage(SheetsClientManager, budget_window=1, max_retries=3, backoff=0.1, max_backoff=0.5)
+    print(f"  backoff, then give up:         flush blocked {blocked:.2f} s, written {flushed}, synced after {caught_up:.2f} s")
+    print("OK")
+
+if __name__ == "__main__":
+    asyncio.run(main(list(map(int, sys.argv[1:])) or [1, 10, 30]))
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("TELEGRAM_TOKEN", "42:LOAD-TEST")
+os.environ.setdefault("ADMIN_IDS", "1")
+
+from src.config import ROUNDS
+from src.db import Database
+from src.journal import team_registered, choice_made, assets_changed
+from src.models import Team, Game
+
+IMPORTS = 5
+# Only needed by /qrs and the Sheets sync, importing them must not slow down a restart
+HEAVY_MODULES = ("PIL", "qrcode", "gspread", "gspread_asyncio", "google.oauth2")
+
+IMPORT_SCRIPT = f"""
+import sys, time
+start = time.perf_counter()
+import aiogram.types, aiogram.methods
+imported = time.perf_counter()
+import src.bot
+print(imported - start, time.perf_counter() - imported)
+print(",".join(name for name in {HEAVY_MODULES!r} if name in sys.modules))
+"""
+
+
+def measure_import() -> tuple[float, float, list[str]]:
+    # A fresh interpreter for every run, so nothing is cached in sys.modules; aiogram's pydantic models are
+    # timed separately, they take most of the time and do not depend on the bot
+    aiogram_times, bot_times, loaded = [], [], []
+    for _ in range(IMPORTS):
+        out = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], capture_output=True, text=True, check=True).stdout.split("\n")
+        aiogram_time, bot_time = map(float, out[0].split())
+        aiogram_times.append(aiogram_time)
+        bot_times.append(bot_time)
+        loaded = [name for name in out[1].split(",") if name]
+    return statistics.median(aiogram_times), statistics.median(bot_times), loaded
+
+async def fill_database(path: str, teams: int, events: int) -> None:
+    # `teams` registrations in a snapshot and `events` journal entries after it
+    db = Database(path)
+    await db.connect()
+    game = Game()
+    state = [Team(f"{i:06x}", f"Team #{i}", i) for i in range(teams)]
+    db.track(game, lambda: state)
+    db.append(*map(team_registered, state))
+    await db.snapshot()
+    for i in range(events):
+        team = state[i % teams]
+        team.choice_1 = ROUNDS[0][i % len(ROUNDS[0])].id
+        team.asset_1 += 1
+        db.append(choice_made(team, 1), assets_changed(team))
+    await db.flush()
+    db.track(None, None)
+    await db.close()
+
+async def measure_restart(path: str) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    db = Database(path)
+    await db.connect()
+    connected = time.perf_counter()
+    teams = await db.load_state(Game())
+    loaded = time.perf_counter()
+    await db.close()
+    return connected - start, loaded - connected, len(teams)
+
+async def main(sizes: list[int]):
+    aiogram_time, bot_time, loaded = measure_import()
+    print(f"import aiogram: {aiogram_time * 1000:.0f} ms, import src.bot after it: {bot_time * 1000:.0f} ms")
+    assert not loaded, f"heavy modules imported at startup: {', '.join(loaded)}"
+    print(f"\n{'teams':>8} {'events':>8} {'connect, ms':>12} {'load_state, ms':>15}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "db.sqlite")
+            await fill_database(path, size, size * 2)
+            connect, load, teams = await measure_restart(path)
+            assert teams == size, f"{teams} teams loaded instead of {size}"
+        print(f"{size:>8} {size * 2:>8} {connect * 1000:>12.1f} {load * 1000:>15.1f}")
+    print("OK")
+
+if __name__ == "__main__":
+    asyncio.run(main(list(map(int, sys.argv[1:])) or [300, 3_000, 30_000]))
@@ -0,0 +1,139 @@
+import asyncio
+import random
+import sys
+import tempfile
+import time
+
+from aiogram.methods import AnswerCallbackQuery, SendMessage
+
+from benchmarks.load import LoadTest, ADMIN_ID, message_update, callback_update
+from src.config import ROUNDS, QUIZ_QUESTIONS, QUIZ_BONUS_COEFFICIENTS
+from src.db import Database
+from src.models import Game
+import src.bot as app
+
+TAPS = 12 # per team, some of them arrive after /stop
+
+
+class StressTest(LoadTest):
+
+    async def register_race(self) -> None:
+        # Two users scan the same QR code at once, only one of them may get the team
+        qr = f"{self.teams:x}race"
+        await self.instance.db.add_qrcodes([qr])
+        intruder = self.owner_ids[-1] + 1
+        await self.phase("/start", [[message_update(self.owner_ids[0], f"/start {qr}")], [message_update(intruder, f"/start {qr}")]])
+        owners = [owner_id for owner_id in (self.owner_ids[0], intruder) if owner_id in self.instance.teams]
+        assert len(owners) == 1, f"QR code claimed by {owners}"
+        self.owner_ids[0] = owners[0]
+
+    async def settle_under_taps(self) -> None:
+        positions = ROUNDS[self.instance.game.round - 1]
+        flows = {
+            owner_id: [
+                callback_update(owner_id, f"invest:{self.instance.game.round}:{self.rnd.choice(positions).id}:{self.rnd.choice('12')}")
+                for _ in range(TAPS)
+            ]
+            for owner_id in self.owner_ids
+        }
+        frozen = {}
+        settle_round = app.settle_round
+        def spy(teams, round_positions, custom_coefficient=None):
+            teams = list(teams)
+            frozen.update({team.owner_id: (team.choice_1, team.choice_2) for team in teams})
+            return settle_round(teams, round_positions, custom_coefficient)
+        app.settle_round = spy
+
+        async def user_flow(flow):
+            for update in flow:
+                await self.feed("invest", update)
+                await asyncio.sleep(self.rnd.uniform(0, 0.02))
+        async def stop():
+            await asyncio.sleep(TAPS * 0.025)
+            await self.feed("/stop", message_update(ADMIN_ID, "/stop"))
+        try:
+            await asyncio.gather(stop(), *(user_flow(flow) for flow in flows.values()))
+            await app.broadcaster.join()
+        finally:
+            app.settle_round = settle_round
+
+        answers = {r.callback_query_id: r.text for r in self.session.requests if isinstance(r, AnswerCallbackQuery)}
+        accepted_total = rejected_total = 0
+        for owner_id, flow in flows.items():
+            expected = [None, None]
+            rejected = False
+            for update in flow:
+                query = update.callback_query
+                _, pos_id, asset = query.data.split(":")[1:]
+                if answers[query.id] is None:
+                    assert not rejected, f"tap of {owner_id} accepted after a rejected one"
+                    expected[int(asset) - 1] = pos_id
+                    accepted_total += 1
+                else:
+                    rejected = True
+                    rejected_total += 1
+            assert frozen[owner_id] == tuple(expected), f"{owner_id}: settled {frozen[owner_id]}, accepted {expected}"
+        assert all(team.choice_1 is None and team.choice_2 is None for team in self.instance.teams), "choices survived /stop"
+        self.taps = accepted_total, rejected_total
+
+        results = [r for r in self.session.requests if isinstance(r, SendMessage) and r.text.startswith("Итоги торгов")]
+        assert len(results) == self.teams, f"{len(results)} round results for {self.teams} teams"
+
+    async def quiz_results_twice(self) -> None:
+        await self.admin("/start_quiz")
+        await self.phase("quiz", [
+            [message_update(owner_id, self.rnd.choice(answers)) for _, answers in QUIZ_QUESTIONS]
+            for owner_id in self.owner_ids
+        ])
+        await self.admin("/end_quiz")
+        expected = {}
+        for team in self.instance.teams:
+            correct = sum(answer.lower() in QUIZ_QUESTIONS[i][1] for i, answer in enumerate(team.quiz_answers))
+            coefficient = QUIZ_BONUS_COEFFICIENTS[correct - 1] if correct else 1
+            expected[team.id] = round(team.asset_1 * coefficient, 2), round(team.asset_2 * coefficient, 2)
+        await self.phase("/quiz_results", [[message_update(ADMIN_ID, "/quiz_results")] for _ in range(2)])
+        actual = {team.id: (team.asset_1, team.asset_2) for team in self.instance.teams}
+        assert actual == expected, "quiz bonus applied more than once"
+
+    async def check_database(self) -> None:
+        # A second connection recovers the state from the journal the same way a restart would
+        await self.instance.db.flush()
+        db = Database(self.instance.db.path)
+        await db.connect()
+        game = Game()
+        try:
+            stored = {team.id: (team.asset_1, team.asset_2, team.choice_1, team.choice_2) for team in await db.load_state(game)}
+        finally:
+            await db.close()
+        actual = {team.id: (team.asset_1, team.asset_2, team.choice_1, team.choice_2) for team in self.instance.teams}
+        assert stored == actual, "database differs from memory"
+        assert (game.round, game.started, game.quiz_started) == (self.instance.game.round, self.instance.game.started, self.instance.game.quiz_started)
+
+    async def run(self) -> None:
+        qrs = [f"{self.teams:x}{i:06x}" for i in range(self.teams)]
+        await self.instance.db.add_qrcodes(qrs)
+        await self.register_race()
+        await self.phase("/start", [[message_update(owner_id, f"/start {qr}")] for owner_id, qr in zip(self.owner_ids[1:], qrs[1:])])
+        await self.admin("/next")
+        await self.settle_under_taps()
+        await self.quiz_results_twice()
+        await self.check_database()
+
+async def main(sizes: list[int], repeats: int):
+    print(f"{'teams':>6} {'run':>4} {'accepted taps':>14} {'rejected taps':>14} {'time, s':>8}")
+    for size in sizes:
+        for i in range(repeats):
+            with tempfile.TemporaryDirectory() as workdir:
+                test = StressTest(size, workdir)
+                test.rnd = random.Random(size * 1000 + i)
+                start = time.perf_counter()
+                await test.setup()
+                try:
+                    await test.run()
+                finally:
+                    await test.teardown()
+                print(f"{size:>6} {i:>4} {test.taps[0]:>14} {test.taps[1]:>14} {time.perf_counter() - start:>8.2f}")
+    print("OK")
+
+if __name__ == "__main__":
+    asyncio.run(main(list(map(int, sys.argv[1:])) or [50, 300], 3))
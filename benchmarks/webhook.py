@@ -0,0 +1,68 @@
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+
+from aiohttp import ClientSession
+
+from benchmarks.load import LoadTest, message_update, callback_update
+from src.config import ROUNDS
+from src.webhook import run_webhook
+import src.bot as app
+
+HOST, PORT, PATH, SECRET = "127.0.0.1", 8081, "/webhook", "load-test-secret"
+
+
+async def post(session: ClientSession, update) -> float:
+    start = time.perf_counter()
+    async with session.post(
+            f"http://{HOST}:{PORT}{PATH}",
+            data=update.model_dump_json(exclude_none=True),
+            headers={"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": SECRET}
+    ) as response:
+        assert response.status == 200, response.status
+    return time.perf_counter() - start
+
+async def run(teams: int, concurrency: int, workdir: str):
+    test = LoadTest(teams, workdir)
+    await test.setup()
+    stop = asyncio.Event()
+    server = asyncio.create_task(run_webhook(app.dp, app.bot, HOST, PORT, PATH, SECRET, concurrency, stop=stop))
+    try:
+        await asyncio.sleep(0.2)
+        qrs = [f"{teams:x}{i:06x}" for i in range(teams)]
+        await test.instance.db.add_qrcodes(qrs)
+        async with ClientSession() as session:
+            await asyncio.gather(*(post(session, message_update(owner_id, f"/start {qr}")) for owner_id, qr in zip(test.owner_ids, qrs)))
+            while len(test.instance.teams) < teams:
+                await asyncio.sleep(0.05)
+            await test.admin("/next")
+            positions = ROUNDS[test.instance.game.round - 1]
+            updates = [
+                callback_update(owner_id, f"invest:{test.instance.game.round}:{positions[(owner_id + asset) % len(positions)].id}:{asset}")
+                for owner_id in test.owner_ids for asset in (1, 2)
+            ]
+            start = time.perf_counter()
+            latencies = sorted(await asyncio.gather(*(post(session, update) for update in updates)))
+            accepted = time.perf_counter() - start
+        stop.set()
+        await server
+        processed = time.perf_counter() - start
+    finally:
+        stop.set()
+        await test.teardown()
+    chosen = sum(1 for team in test.instance.teams if team.choice_1 and team.choice_2)
+    print(
+        f"{teams:>6} {concurrency:>12} {statistics.median(latencies) * 1000:>13.1f} {latencies[int(len(latencies) * 0.99)] * 1000:>13.1f}"
+        f" {accepted:>12.2f} {processed:>13.2f} {chosen:>9}"
+    )
+
+async def main(teams: int, concurrencies: list[int]):
+    print(f"{'teams':>6} {'concurrency':>12} {'POST p50, ms':>13} {'POST p99, ms':>13} {'accepted, s':>12} {'processed, s':>13} {'invested':>9}")
+    for concurrency in concurrencies:
+        with tempfile.TemporaryDirectory() as workdir:
+            await run(teams, concurrency, workdir)
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 300, list(map(int, sys.argv[2:])) or [10, 100]))
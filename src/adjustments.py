@@ -0,0 +1,82 @@
+import csv
+import math
+from dataclasses import dataclass
+from typing import Iterable
+
+from src.models import Team
+from src.registry import TeamRegistry
+
+MAX_FILE_SIZE = 1024 * 1024 # CSV uploaded with /multiply
+
+
+@dataclass(slots=True)
+class Adjustment:
+    team: Team
+    asset: int # 1-2
+    factor: float
+    old_value: float = 0
+    new_value: float = 0
+
+
+def message_rows(text: str) -> list[list[str]]:
+    # Lines typed after the command: "f1f2f3 1 1.5"
+    return [line.split() for line in text.splitlines()]
+
+def csv_rows(text: str) -> list[list[str]]:
+    # Exports use "," or, with decimal commas, ";": "f1f2f3, 1, 1.5", "f1f2f3;1;1,5", "f1f2f3,1,\"1,5\""
+    first_line = next((line for line in text.splitlines() if line.strip()), "")
+    delimiter = ";" if ";" in first_line else ","
+    return list(csv.reader(text.splitlines(), delimiter=delimiter, skipinitialspace=True))
+
+def parse_adjustments(rows: Iterable[list[str]], teams: TeamRegistry) -> tuple[list[Adjustment], list[str]]:
+    # Every line is checked before anything is applied, the errors name the line they were found on
+    adjustments, errors = [], []
+    seen: dict[tuple[str, int], int] = {} # team id, asset: line
+    for number, row in enumerate(rows, 1):
+        fields = [field.strip() for field in row]
+        if not any(fields) or fields[0].startswith("#"):
+            continue
+        if len(fields) != 3:
+            errors.append(f"Строка {number}: нужно [ID КОМАНДЫ] [АКТИВ: 1-2] [МУЛЬТИПЛИКАТОР]")
+            continue
+        team_id, asset, factor = fields[0], fields[1], fields[2].replace(",", ".")
+        if number == 1 and not is_number(asset) and not is_number(factor):
+            continue # CSV header
+        team = teams.by_id(team_id)
+        if team is None:
+            errors.append(f"Строка {number}: неверный ID команды {team_id}")
+        elif asset not in ("1", "2"):
+            errors.append(f"Строка {number}: актив должен быть 1 или 2")
+        elif not is_number(factor):
+            errors.append(f"Строка {number}: неверный мультипликатор {factor}")
+        elif (team.id, int(asset)) in seen:
+            errors.append(f"Строка {number}: актив {asset} команды {team.id} уже указан в строке {seen[(team.id, int(asset))]}")
+        else:
+            seen[(team.id, int(asset))] = number
+            adjustments.append(Adjustment(team, int(asset), float(factor)))
+    return adjustments, errors
+
+def is_number(value: str) -> bool:
+    try:
+        return math.isfinite(float(value))
+    except ValueError:
+        return False
+
+def apply_adjustments(adjustments: list[Adjustment]) -> None:
+    for adjustment in adjustments:
+        team = adjustment.team
+        if adjustment.asset == 1:
+            adjustment.old_value = team.asset_1
+            team.asset_1 *= adjustment.factor
+            adjustment.new_value = team.asset_1
+        else:
+            adjustment.old_value = team.asset_2
+            team.asset_2 *= adjustment.factor
+            adjustment.new_value = team.asset_2
+
+def summary_lines(adjustments: list[Adjustment]) -> list[str]:
+    return [
+        f"{adjustment.team.id} {adjustment.team.name}, актив {'I' * adjustment.asset}:"
+        f" {adjustment.old_value} * {adjustment.factor} -> {adjustment.new_value}"
+        for adjustment in adjustments
+    ]
@@ -1,62 +1,80 @@
 import asyncio
-import io
-import json
 import os
-import secrets
-import zipfile
+from contextlib import suppress
+from functools import cache
 
-import aiosqlite
-from PIL import Image
 from aiogram import Bot, Dispatcher, F
+from aiogram.exceptions import TelegramAPIError
 from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, BufferedInputFile, InlineKeyboardMarkup, CallbackQuery, InputFile
-from gspread import Cell
-from gspread_asyncio import AsyncioGspreadClientManager
-from qrcode import ERROR_CORRECT_L
-from qrcode.main import QRCode
-from google.oauth2.service_account import Credentials
-
-from src.config import TELEGRAM_TOKEN, SQLITE_PATH, ROUNDS, SHEET_URL, ALL_POSITIONS, QUIZ_QUESTIONS, \
-    QUIZ_BONUS_COEFFICIENTS
+from aiogram.types import Message, InlineKeyboardMarkup, CallbackQuery
+
+from src.adjustments import MAX_FILE_SIZE, message_rows, csv_rows, parse_adjustments, apply_adjustments, summary_lines
+from src.broadcast import Broadcaster, BroadcastReport
+from src.config import TELEGRAM_TOKEN, GAMES, ALL_POSITIONS, QUIZ_QUESTIONS, POSITIONS_BY_ID, RUN_MODE, \
+    UPDATES_CONCURRENCY, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, METRICS_HOST, METRICS_PORT, \
+    SHEETS_REQUESTS_PER_MINUTE
 from src.filters import IsAdminFilter
-from src.keyboards import create_round_keyboard
-from src.models import Team, Game, RoundPosition
+from src.games import GameInstance, Games
+from src.journal import team_registered, team_renamed, choice_made, assets_changed, phase_changed, round_settled, \
+    quiz_answered, quiz_settled
+from src.metrics import metrics, HandlerMetricsMiddleware, TelegramMetricsMiddleware, start_metrics_server
+from src.models import Team
+from src.qr import QrRenderer, ArchiveInputFile, QR_FORMATS
+from src.quiz import is_correct, bonus_coefficient
+from src.settlement import settle_round
+from src.sheets import service_account_manager
 from src.states import UserState
 from src.utils import is_float
+from src.webhook import run_webhook
 
 bot = Bot(TELEGRAM_TOKEN)
 dp = Dispatcher()
+dp.message.middleware(HandlerMetricsMiddleware())
+dp.callback_query.middleware(HandlerMetricsMiddleware())
+bot.session.middleware(TelegramMetricsMiddleware())
+broadcaster = Broadcaster(bot)
+qr_renderer = QrRenderer()
 
-user_teams: dict[int, Team] = {}
-game: Game = Game()
-agcm: AsyncioGspreadClientManager
+# Every game has its own state, locks, journal and sheet; admin handlers get the game of the admin from is_admin,
+# player handlers look it up by the owner id
+games = Games()
+is_admin = IsAdminFilter(games)
 
 # Register
 
 @dp.message(CommandStart(), F.text.split().len() == 2)
 async def register_handler(message: Message, state: FSMContext):
-    if message.from_user.id in user_teams:
+    if games.by_owner(message.from_user.id):
         await message.answer("Вы уже зарегистрированы")
         return
-    if game.round != 0 or game.started:
+    # QR links carry the game id, codes printed before that belong to the first game
+    game_id, _, team_id = message.text.split()[1].rpartition("-")
+    instance = games.by_id(game_id) if game_id else games.default
+    if instance is None:
+        await message.answer("Неверный QR-код")
+        return
+    if instance.game.round != 0 or instance.game.started:
         await message.answer("Игра уже началсь")
         return
-    team_id = message.text.split()[1]
-    async with aiosqlite.connect(SQLITE_PATH) as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("SELECT * FROM qrcodes WHERE id=?", (team_id,))
-            row = await cur.fetchone()
-        if not row:
-            await message.answer("Неверный QR-код")
+    # Unknown and used codes are rejected from memory, without touching the database
+    activated = instance.db.qrcode_activated(team_id)
+    if activated is None:
+        await message.answer("Неверный QR-код")
+        return
+    if activated:
+        await message.answer("QR-код уже активирован")
+        return
+    async with games.owner_locks(message.from_user.id), instance.team_locks(team_id):
+        if games.by_owner(message.from_user.id):
+            await message.answer("Вы уже зарегистрированы")
             return
-        if row[1]:
+        if not await instance.db.claim_qrcode(team_id):
             await message.answer("QR-код уже активирован")
             return
-        await conn.execute("UPDATE qrcodes SET activated=1 WHERE id=?", (team_id,))
-        await conn.commit()
-    user_teams[message.from_user.id] = Team(team_id, f"Team #{team_id}", message.from_user.id)
-    await save_team_to_db(user_teams[message.from_user.id])
+        team = Team(team_id, f"Team #{team_id}", message.from_user.id)
+        games.add_team(instance, team)
+        await instance.db.write(team_registered(team))
     await message.answer("Назовите свою команду")
     await state.set_state(UserState.team_name)
 
@@ -66,366 +84,410 @@ async def start_handler(message: Message):
 
 @dp.message(UserState.team_name)
 async def set_name_handler(message: Message, state: FSMContext):
-    if message.from_user.id not in user_teams:
+    instance = games.by_owner(message.from_user.id)
+    if instance is None:
         await state.clear()
         return
-    team = user_teams[message.from_user.id]
-    team.name = message.text
+    team = instance.teams.by_owner(message.from_user.id)
+    async with instance.team_locks(team.id):
+        team.name = message.text
+        instance.db.append(team_renamed(team))
     await message.answer("Вы успешно зарегистрировались")
     await state.clear()
-    await update_google_sheets(False)
-    await update_team_in_db(team)
+    if instance.sheets:
+        instance.sheets.mark_dirty()
 
 # Admin
 
-@dp.message(Command("start_quiz"), IsAdminFilter())
-async def start_quiz_handler(message: Message):
-    if game.started:
-        await message.answer("Текущий раунд ещё не завершён (/stop)")
-        return
-    if game.quiz_started:
-        await message.answer("Квиз уже идёт (/end_quiz)")
-        return
-    game.quiz_started = True
-    await message.answer("Квиз начат")
-    await broadcast(f"Начинаем квиз, введите ответ на вопрос одним словом\n{QUIZ_QUESTIONS[0][0]}")
-
-@dp.message(Command("end_quiz"), IsAdminFilter())
-async def end_quiz_handler(message: Message):
-    if not game.quiz_started:
-        await message.answer("Квиз ещё не начался")
-        return
-    game.quiz_started = False
-    await message.answer("Квиз окончен, используйте /quiz_results для подведения итогов")
-
-@dp.message(Command("quiz_results"), IsAdminFilter())
-async def quiz_results_handler(message: Message):
-    for team in user_teams.values():
-        if not team.quiz_answers:
-            continue
-        total_answers = 0
-        for i, answer in enumerate(team.quiz_answers):
-            if answer.lower() in list(map(str.lower, QUIZ_QUESTIONS[i][1])):
-                total_answers += 1
-        coefficient = QUIZ_BONUS_COEFFICIENTS[total_answers-1] if total_answers > 0 else 1
-        old_asset_1, old_asset_2 = team.asset_1, team.asset_2
-        team.asset_1 = round(team.asset_1 * coefficient, 2)
-        team.asset_2 = round(team.asset_2 * coefficient, 2)
-        await bot.send_message(
-            team.owner_id,
-           f"Вы ответили правильно на {total_answers} / {len(QUIZ_QUESTIONS)} вопросов"
-            f"\nАктив I: {old_asset_1} * {coefficient} -> {team.asset_1}"
-            f"\nАктив II: {old_asset_2} * {coefficient} -> {team.asset_2}"
-        )
-        team.quiz_answers.clear()
-        if total_answers > 0:
-            await update_team_in_db(team)
-    await update_google_sheets(False)
-    await message.answer("Результаты оглашены")
-
-@dp.message(Command("next"), IsAdminFilter())
-async def next_handler(message: Message):
-    if game.started:
-        await message.answer("Текущий раунд ещё не завершён (/stop)")
-        return
-    if game.quiz_started:
-        await message.answer("Для начала завершите квиз (/end_quiz)")
-        return
-    if game.round == len(ROUNDS):
-        await message.answer("Это был последний раунд")
-        return
-
-    game.round += 1
-    game.started = True
+@dp.message(Command("start_quiz"), is_admin)
+async def start_quiz_handler(message: Message, instance: GameInstance):
+    game = instance.game
+    async with instance.phase_lock:
+        if game.started:
+            await message.answer("Текущий раунд ещё не завершён (/stop)")
+            return
+        if game.quiz_started:
+            await message.answer("Квиз уже идёт (/end_quiz)")
+            return
+        game.quiz_started = True
+        await instance.db.write(phase_changed(game))
+        await message.answer("Квиз начат")
+        report = await broadcast(instance, f"Начинаем квиз, введите ответ на вопрос одним словом\n{QUIZ_QUESTIONS[0][0]}")
+        await message.answer(str(report))
+
+@dp.message(Command("end_quiz"), is_admin)
+async def end_quiz_handler(message: Message, instance: GameInstance):
+    game = instance.game
+    async with instance.phase_lock:
+        if not game.quiz_started:
+            await message.answer("Квиз ещё не начался")
+            return
+        game.quiz_started = False
+        await instance.db.write(phase_changed(game))
+        await message.answer("Квиз окончен, используйте /quiz_results для подведения итогов")
+
+@dp.message(Command("quiz_results"), is_admin)
+async def quiz_results_handler(message: Message, instance: GameInstance):
+    updated_teams, texts = [], []
+    async with instance.phase_lock, instance.team_locks.all():
+        # Answers are cleared in the same step the bonus is applied, so a repeated call finds nothing to apply
+        for team in instance.teams.values():
+            if not team.quiz_answers:
+                continue
+            coefficient = bonus_coefficient(team.quiz_correct)
+            old_asset_1, old_asset_2 = team.asset_1, team.asset_2
+            team.asset_1 = round(team.asset_1 * coefficient, 2)
+            team.asset_2 = round(team.asset_2 * coefficient, 2)
+            texts.append((
+                team.owner_id,
+                f"Вы ответили правильно на {team.quiz_correct} / {len(QUIZ_QUESTIONS)} вопросов"
+                f"\nАктив I: {old_asset_1} * {coefficient} -> {team.asset_1}"
+                f"\nАктив II: {old_asset_2} * {coefficient} -> {team.asset_2}"
+            ))
+            team.quiz_answers.clear()
+            team.quiz_correct = 0
+            instance.teams.leaderboard.update(team)
+            updated_teams.append(team)
+        await instance.db.write(quiz_settled(updated_teams))
+    if instance.sheets:
+        instance.sheets.mark_dirty()
+    report = await broadcaster.send_each(texts)
+    await message.answer(f"Результаты оглашены\n{report}")
+
+@dp.message(Command("next"), is_admin)
+async def next_handler(message: Message, instance: GameInstance):
+    game = instance.game
+    async with instance.phase_lock:
+        if game.started:
+            await message.answer("Текущий раунд ещё не завершён (/stop)")
+            return
+        if game.quiz_started:
+            await message.answer("Для начала завершите квиз (/end_quiz)")
+            return
+        if game.round == len(instance.rounds):
+            await message.answer("Это был последний раунд")
+            return
 
-    for i in 1,2: # asset 1 and 2
-        await broadcast(
-            f"Раунд {game.round}.\nВо что вложиться {'I' if i == 1 else 'II'} активом?",
-            create_round_keyboard(game.round, i, None)
-        )
-    await update_game_in_db()
-    await message.answer(f"Начинаем {game.round} раунд")
+        game.round += 1
+        game.started = True
+        await instance.db.write(phase_changed(game))
 
-@dp.message(Command("stop"), IsAdminFilter())
-async def stop_handler(message: Message):
-    if not game.started and not game.wait_for_coefficient:
-        await message.answer("Текущий раунд уже завершён")
-        return
-    game.started = False
+        report = BroadcastReport()
+        for i in 1,2: # asset 1 and 2
+            report += await broadcast(
+                instance,
+                f"Раунд {game.round}.\nВо что вложиться {'I' if i == 1 else 'II'} активом?",
+                instance.round_keyboard(i, None)
+            )
+        await message.answer(f"Начинаем {game.round} раунд\n{report}")
+
+@dp.message(Command("stop"), is_admin)
+async def stop_handler(message: Message, instance: GameInstance):
+    game, user_teams = instance.game, instance.teams
+    async with instance.phase_lock:
+        if not game.started and not game.wait_for_coefficient:
+            await message.answer("Текущий раунд уже завершён")
+            return
+        # Taps are rejected from here on, the barrier below waits for the ones already in progress
+        game.started = False
 
-    for position in ROUNDS[game.round-1]:
-        if position.custom_coefficient is not None:
+        positions = instance.rounds[game.round-1]
+        custom_coefficient = None
+        if any(position.custom_coefficient is not None for position in positions):
             args = message.text.split()
             if len(args) != 2 or not is_float(args[1]):
                 game.wait_for_coefficient = True
+                await instance.db.write(phase_changed(game))
                 await message.answer("Для этого раунда необходим кастомный коэффициент, используйте: /stop [КОЭФФИЦИЕНТ]")
                 return
-            position.custom_coefficient_value = float(args[1])
-
-    game.wait_for_coefficient = False
-    for team in user_teams.values():
-        old_asset_1, old_asset_2 = team.asset_1, team.asset_2
-        coef_1, coef_2 = 1, 1
-        if team.choice_1:
-            coef_1 = round(get_pos_by_id(team.choice_1).get_coefficient(list(user_teams.values())), 2)
-            team.asset_1 *= coef_1
-        if team.choice_2:
-            coef_2 = round(get_pos_by_id(team.choice_2).get_coefficient(list(user_teams.values())), 2)
-            team.asset_2 *= coef_2
-        team.asset_1, team.asset_2 = round(team.asset_1, 2), round(team.asset_2, 2)
-        name_1 = get_pos_by_id(team.choice_1).name if team.choice_1 else "Не выбрано"
-        name_2 = get_pos_by_id(team.choice_2).name if team.choice_2 else "Не выбрано"
-        await bot.send_message(
-            team.owner_id,
-            f"Итоги торгов:"
-            f"\nАктив I ({name_1}): {old_asset_1} * {coef_1} -> {team.asset_1}"
-            f"\nАктив II ({name_2}): {old_asset_2} * {coef_2} -> {team.asset_2}"
-        )
-        await update_team_in_db(team)
-    for pos in ROUNDS[game.round-1]:
-        game.history.setdefault(pos.id, {})
-        game.history[pos.id][str(game.round)] = (
-            pos.get_invests_by_id(pos.id, user_teams.values()),
-            pos.get_coefficient(user_teams.values()) or "-"
+            custom_coefficient = float(args[1])
+
+        game.wait_for_coefficient = False
+        texts = []
+        async with instance.team_locks.all():
+            settlement = settle_round(user_teams.values(), positions, custom_coefficient)
+            user_teams.leaderboard.update_many(user_teams.values())
+            for result in settlement.results:
+                team = result.team
+                name_1 = POSITIONS_BY_ID[team.choice_1].name if team.choice_1 else "Не выбрано"
+                name_2 = POSITIONS_BY_ID[team.choice_2].name if team.choice_2 else "Не выбрано"
+                texts.append((
+                    team.owner_id,
+                    f"Итоги торгов:"
+                    f"\nАктив I ({name_1}): {result.old_asset_1} * {result.coef_1} -> {team.asset_1}"
+                    f"\nАктив II ({name_2}): {result.old_asset_2} * {result.coef_2} -> {team.asset_2}"
+                    f"\nМесто: {user_teams.leaderboard.rank(team)} / {len(user_teams)}"
+                ))
+            round_results = []
+            for pos in positions:
+                game.history.setdefault(pos.id, {})
+                game.history[pos.id][str(game.round)] = (
+                    settlement.invests[pos.id],
+                    settlement.coefficients[pos.id] or "-"
+                )
+                round_results.append((
+                    game.round, pos.id, settlement.invests[pos.id], settlement.coefficients[pos.id], settlement.invested[pos.id]
+                ))
+            instance.round_settled()
+            for team in user_teams.values():
+                team.choice_1 = team.choice_2 = None
+            await instance.db.write(round_settled(game, user_teams.values()), phase_changed(game), round_results=round_results)
+        # The results are sent by the broadcaster in the background, /delivery shows how far it got
+        instance.results_delivery = broadcaster.send_each_in_background(texts)
+        await message.answer(f"Раунд завершён, итоги рассылаются командам ({len(texts)}), прогресс: /delivery")
+        # Written by the sync worker right away, but outside the phase lock, so a Sheets outage cannot hold it
+        if instance.sheets:
+            instance.sheets.flush_soon(positions=True)
+
+@dp.message(Command("delivery"), is_admin)
+async def delivery_handler(message: Message, instance: GameInstance):
+    report = instance.results_delivery
+    if report is None:
+        await message.answer("Итоги раунда ещё не рассылались")
+        return
+    await message.answer(f"Итоги раунда {'разосланы' if report.done else 'рассылаются'}\n{report}")
+
+@dp.message(Command("multiply"), is_admin)
+async def multiply_handler(message: Message, instance: GameInstance):
+    # One adjustment per line, after the command or in an attached CSV file. All lines are checked first,
+    # then applied under the locks of their teams and written in one transaction
+    rows = message_rows("".join((message.text or message.caption).split(maxsplit=1)[1:]))
+    if message.document:
+        if (message.document.file_size or 0) > MAX_FILE_SIZE:
+            await message.answer(f"Файл больше {MAX_FILE_SIZE // 1024} КБ")
+            return
+        try:
+            rows = csv_rows((await bot.download(message.document)).read().decode("utf-8-sig"))
+        except UnicodeDecodeError:
+            await message.answer("Не удалось прочитать файл, нужен CSV в UTF-8")
+            return
+    adjustments, errors = parse_adjustments(rows, instance.teams)
+    if errors:
+        more = f"\n...и ещё {len(errors) - 20}" if len(errors) > 20 else ""
+        await message.answer("Ничего не изменено:\n" + "\n".join(errors[:20]) + more)
+        return
+    if not adjustments:
+        await message.answer(
+            "Используйте: /multiply [ID КОМАНДЫ] [АКТИВ: 1-2] [МУЛЬТИПЛИКАТОР], по одной строке на актив, "
+            "или прикрепите CSV файл с подписью /multiply"
         )
-    for team in user_teams.values():
-        team.choice_1 = team.choice_2 = None
-        await update_team_in_db(team)
-    await update_google_sheets()
-    await update_game_in_db()
-    await message.answer("Раунд завершён")
-
-@dp.message(Command("multiply"), IsAdminFilter())
-async def multiply_handler(message: Message):
-    args = message.text.split()
-    if len(args) == 4:
-        args[3] = args[3].replace(",", ".")
-    if len(args) != 4 or args[2] not in ("1", "2") or not is_float(args[3]):
-        await message.answer("Используйте: /multiply [ID КОМАНДЫ] [АКТИВ: 1-2] [МУЛЬТИПЛИКАТОР]")
         return
-    team = get_team_by_id(args[1])
-    if not team:
-        await message.answer("Неверный ID команды")
+    teams = list({adjustment.team.id: adjustment.team for adjustment in adjustments}.values())
+    async with instance.team_locks.many(team.id for team in teams):
+        apply_adjustments(adjustments)
+        instance.teams.leaderboard.update_many(teams)
+        await instance.db.write(*map(assets_changed, teams))
+    if instance.sheets:
+        instance.sheets.mark_dirty()
+    if len(adjustments) == 1:
+        await message.answer(f"Новое значение актива: {adjustments[0].new_value}")
         return
-    if args[2] == "1":
-        team.asset_1 *= float(args[3])
-    else:
-        team.asset_2 *= float(args[3])
-    await message.answer(f"Новое значение актива: {team.asset_1 if args[2] == "1" else team.asset_2}")
-    await update_google_sheets(False)
-    await update_team_in_db(team)
+    text = f"Изменено активов: {len(adjustments)}, команд: {len(teams)}\n\n" + "\n".join(summary_lines(adjustments))
+    for i in range(0, len(text), 4096):
+        await message.answer(text[i:i+4096])
 
-@dp.message(Command("qrs"), IsAdminFilter())
-async def qrs_handler(message: Message):
+@dp.message(Command("qrs"), is_admin)
+async def qrs_handler(message: Message, instance: GameInstance):
     args = message.text.split()[1:]
-    if not args or not args[0].isdigit():
-        await message.answer("Используйте: /qrs [QR_COUNT]")
+    if (not args or not args[0].isdigit() or len(args) > 3
+            or len(args) > 1 and args[1].lower() not in QR_FORMATS
+            or len(args) > 2 and not (args[2].isdigit() and 1 <= int(args[2]) <= 95)):
+        await message.answer("Используйте: /qrs [QR_COUNT] [ФОРМАТ: jpeg-png] [КАЧЕСТВО JPEG: 1-95]")
         return
-    qrs = [[secrets.token_hex(3)] for _ in range(int(args[0]))]
-    async with aiosqlite.connect(SQLITE_PATH) as conn:
-        await conn.executemany("INSERT INTO qrcodes (id) VALUES (?)", qrs)
-        await conn.commit()
-    file = io.BytesIO()
+    image_format = args[1].lower() if len(args) > 1 else "jpeg"
+    quality = int(args[2]) if len(args) > 2 else 90
+    if int(args[0]) > instance.db.qrcodes_left:
+        await message.answer(f"Можно выпустить ещё не больше {instance.db.qrcodes_left} QR-кодов")
+        return
+    qrs = await instance.db.issue_qrcodes(int(args[0]))
     me = await bot.get_me()
-    with zipfile.ZipFile(file, "w") as zf:
-        qr_template = Image.open("qr_template.png")
-        for qr in qrs:
-            qr_file = io.BytesIO()
-            qr_data = QRCode(
-                error_correction=ERROR_CORRECT_L,
-                box_size=10,
-                border=0,
-            )
-            qr_data.add_data(f"https://t.me/{me.username}?start={qr[0]}")
-            qr_data.make()
-            qr_code_img = qr_data.make_image(fill_color="white", back_color="#141414").resize((750, 750))
-            img = qr_template.copy()
-            img.paste(qr_code_img, (150, 650))
-            img.save(qr_file, format="PNG")
-            qr_file.seek(0)
-            zf.writestr(f"{qr[0]}.jpeg", qr_file.read())
-    file.seek(0)
-    await message.answer_document(BufferedInputFile(file.read(), filename="qrs.zip"))
-
-@dp.message(Command("send"), IsAdminFilter())
-async def send_handler(message: Message):
+    codes = {qr: f"https://t.me/{me.username}?start={instance.id}-{qr}" for qr in qrs}
+    i = 0
+    async for archive in qr_renderer.render_archives(codes, image_format, quality):
+        i += 1
+        await message.answer_document(ArchiveInputFile(archive, filename=f"qrs_{i}.zip" if i > 1 else "qrs.zip"))
+
+@dp.message(Command("send"), is_admin)
+async def send_handler(message: Message, instance: GameInstance):
     photo = message.photo
     args = (message.text or message.caption).split()[1:]
     if not args and not photo:
         await message.answer("Используйте: /send [TEXT] или прикрепите фотографию")
         return
-    if photo:
-        photo_file = io.BytesIO()
-        await bot.download(photo[-1], photo_file)
-        photo_file.seek(0)
-    await broadcast(" ".join(args), photo=BufferedInputFile(photo_file.read(), filename="photo.png") if photo else None)
-
-@dp.message(Command("stat"), IsAdminFilter())
-async def stats_handler(message: Message):
+    # The photo is already stored by Telegram, so it is fanned out by file_id without re-uploading
+    report = await broadcast(instance, " ".join(args), photo=photo[-1].file_id if photo else None)
+    await message.answer(str(report))
+
+@dp.message(Command("stat"), is_admin)
+async def stats_handler(message: Message, instance: GameInstance):
     text = "Топ команд:\n\n"
-    for i, team in enumerate(sorted(user_teams.values(), key=lambda x: x.total_score, reverse=True), 1):
+    for i, team in enumerate(instance.teams.leaderboard, 1):
         text += f"{i}. {team.name} ({team.total_score}) [{team.id}]\n"
-    text += "\nКомпании:"
+    # The companies part only changes when a round settles
+    text += instance.rendered("stat_positions", lambda: render_positions(instance.game.history))
+    await message.answer(text)
+
+@dp.message(Command("analytics"), is_admin)
+async def analytics_handler(message: Message):
+    # Aggregated by SQLite in every game's database, only one row per position is loaded
+    admin_games = games.admin_games(message.from_user.id)
+    totals: dict[str, list] = {} # position id: rounds, investors, coefficient sum, coefficient count, invested
+    for instance in admin_games:
+        for pos_id, *stats in await instance.db.position_stats():
+            total = totals.setdefault(pos_id, [0, 0, 0.0, 0, 0.0])
+            for i, value in enumerate(stats):
+                total[i] += value or 0
+    text = f"Аналитика по играм: {', '.join(instance.id for instance in admin_games)}"
     for position in ALL_POSITIONS:
-        position_history = game.history.get(position.id, None)
-        if not position_history:
+        if position.id not in totals:
             continue
-        text += f"\n\n{position.name}:\n" + "\n".join([f"{round}. {round_data[1]}x ({round_data[0]})" for round, round_data in position_history.items()])
+        rounds, invests, coefficient_sum, coefficient_count, invested = totals[position.id]
+        coefficient = f"{coefficient_sum / coefficient_count:.2f}x" if coefficient_count else "-"
+        text += f"\n\n{position.name}: раундов {rounds}, вложений {invests}, средний коэффициент {coefficient}, вложено {round(invested, 2)}"
     await message.answer(text)
 
-@dp.message(Command("help"), IsAdminFilter())
+@dp.message(Command("metrics"), is_admin)
+async def metrics_handler(message: Message):
+    text = metrics.summary()
+    for i in range(0, len(text), 4096):
+        await message.answer(text[i:i+4096])
+
+@dp.message(Command("game"), is_admin)
+async def game_handler(message: Message, instance: GameInstance):
+    admin_games = games.admin_games(message.from_user.id)
+    args = message.text.split()[1:]
+    if args:
+        selected = next((game for game in admin_games if game.id == args[0]), None)
+        if selected is None:
+            await message.answer("Неверный ID игры")
+            return
+        games.select(message.from_user.id, selected)
+        instance = selected
+    await message.answer(
+        "Ваши игры:\n" + "\n".join(f"{'✅ ' if game is instance else ''}{game.id} ({len(game.teams)} команд)" for game in admin_games)
+    )
+
+@dp.message(Command("help"), is_admin)
 async def help_handler(message: Message):
     await message.answer(
         "Список админ-команд:"
         "\n/next - Следующий раунд"
         "\n/stop - Завершить раунд"
+        "\n/delivery - Прогресс рассылки итогов раунда"
         "\n/start_quiz - Начать квиз"
         "\n/end_quiz - Закончить квиз"
         "\n/quiz_results - Огласить результаты квиза"
         "\n/send [TEXT or PHOTO] - Отправка рассылки всем участникам"
-        "\n/multiply [ID КОМАНДЫ] [АКТИВ: 1-2] [МУЛЬТИПЛИКАТОР] - Мультипликация актива команды"
+        "\n/multiply [ID КОМАНДЫ] [АКТИВ: 1-2] [МУЛЬТИПЛИКАТОР] - Мультипликация актива команды, можно несколько строк или CSV файл"
         "\n/stat - Текстовое представление табличной статистики"
-        "\n/qrs [QR_COUNT] - Генерация QR-кодов для регистрации"
+        "\n/analytics - Статистика компаний по всем вашим играм"
+        "\n/metrics - Время обработки команд и внешних запросов"
+        "\n/qrs [QR_COUNT] [ФОРМАТ: jpeg-png] [КАЧЕСТВО JPEG: 1-95] - Генерация QR-кодов для регистрации"
+        "\n/game [ID ИГРЫ] - Список ваших игр и выбор игры, к которой относятся команды"
     )
 
 # Game
 
 @dp.callback_query(F.data.startswith("invest"))
 async def invest_handler(query: CallbackQuery):
-    if query.from_user.id not in user_teams:
+    instance = games.by_owner(query.from_user.id)
+    if instance is None:
         return
+    game = instance.game
     if not game.started:
         await query.answer("Торги уже закончились")
         return
     round_id, pos_id, asset = query.data.split(":")[1:]
-    if int(round_id) != game.round:
-        await query.answer("Торги уже закончились")
-        return
-    team = user_teams[query.from_user.id]
-    if asset == "1":
-        team.choice_1 = pos_id
-        await query.message.edit_reply_markup(reply_markup=create_round_keyboard(game.round, 1, team.choice_1))
-    else:
-        team.choice_2 = pos_id
-        await query.message.edit_reply_markup(reply_markup=create_round_keyboard(game.round, 2, team.choice_2))
-    await query.answer()
-    await update_team_in_db(team)
+    team = instance.teams.by_owner(query.from_user.id)
+    text, keyboard = None, None
+    async with instance.team_locks(team.id):
+        # Checked under the team lock, so a tap either lands before the /stop barrier or is rejected
+        if not game.started or int(round_id) != game.round:
+            text = "Торги уже закончились"
+        elif pos_id in instance.round_positions[game.round-1] and (team.choice_1 if asset == "1" else team.choice_2) != pos_id:
+            if asset == "1":
+                team.choice_1 = pos_id
+            else:
+                team.choice_2 = pos_id
+            instance.db.append(choice_made(team, int(asset)))
+            keyboard = instance.round_keyboard(int(asset), pos_id)
+    # Telegram is called after the lock is released, /stop does not wait for it. The choice is already made
+    # and journaled, a failed edit only leaves the old mark on the keyboard and is counted in telegram_errors_total
+    if keyboard is not None:
+        with suppress(TelegramAPIError):
+            await query.message.edit_reply_markup(reply_markup=keyboard)
+    await query.answer(text)
 
 @dp.message()
 async def quiz_handler(message: Message):
-    if message.from_user.id not in user_teams:
+    instance = games.by_owner(message.from_user.id)
+    if instance is None or not instance.game.quiz_started:
         return
-    if not game.quiz_started:
-        return
-    team = user_teams[message.from_user.id]
-    if len(team.quiz_answers) == len(QUIZ_QUESTIONS):
-        return
-    team.quiz_answers.append(message.text)
-    if len(team.quiz_answers) != len(QUIZ_QUESTIONS):
-        await message.answer(QUIZ_QUESTIONS[len(team.quiz_answers)][0])
+    team = instance.teams.by_owner(message.from_user.id)
+    async with instance.team_locks(team.id):
+        if not instance.game.quiz_started or len(team.quiz_answers) == len(QUIZ_QUESTIONS):
+            return
+        answer = message.text or ""
+        team.quiz_correct += is_correct(len(team.quiz_answers), answer)
+        team.quiz_answers.append(answer)
+        answered = len(team.quiz_answers)
+        instance.db.append(quiz_answered(team))
+    if answered != len(QUIZ_QUESTIONS):
+        await message.answer(QUIZ_QUESTIONS[answered][0])
     else:
         await message.answer("Ответы приняты")
 
 # Functions
 
-def get_team_by_id(team_id: str) -> Team | None:
-    return next(filter(lambda team: team.id == team_id.lower(), user_teams.values()), None)
-
-def get_pos_by_id(pos_id: str) -> RoundPosition:
-    return next(filter(lambda p: p.id == pos_id, ALL_POSITIONS))
-
-async def update_google_sheets(update_positions: bool = True) -> None:
-    agc = await agcm.authorize()
-    spreadsheet = await agc.open_by_url(SHEET_URL)
-
-    sheet = await spreadsheet.get_worksheet(0)
-    rows = [["Место", "Имя", "Сумма", "ID"]]
-    for i, team in enumerate(sorted(user_teams.values(), key=lambda x: x.total_score, reverse=True), 1):
-        rows.append([i, team.name, team.total_score, team.id])
-    await sheet.clear()
-    await sheet.insert_rows(rows)
-
-    if update_positions:
-        sheet = await spreadsheet.get_worksheet(1)
-        cells = []
-        for i, position in enumerate(ALL_POSITIONS):
-            position_history = game.history.get(position.id, None)
-            if not position_history:
-                continue
-            for round, round_data in position_history.items():
-                cells.append(Cell(4*i + 1 + 2, int(round) + 1, str(round_data[0])))
-                cells.append(Cell(4*i + 1 + 3, int(round) + 1, str(round_data[1])))
-        await sheet.update_cells(cells)
-
-
-async def save_team_to_db(team: Team) -> None:
-    async with aiosqlite.connect(SQLITE_PATH) as conn:
-        await conn.execute("INSERT INTO teams VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (team.id, team.name, team.owner_id, team.asset_1, team.asset_2, team.choice_1, team.choice_2, json.dumps(team.quiz_answers)))
-        await conn.commit()
-
-async def update_team_in_db(team: Team) -> None:
-    async with aiosqlite.connect(SQLITE_PATH) as conn:
-        await conn.execute("UPDATE teams SET name=?, asset_1=?, asset_2=?, choice_1=?, choice_2=?, quiz_answers=? WHERE id=?", (team.name, team.asset_1, team.asset_2, team.choice_1, team.choice_2, json.dumps(team.quiz_answers), team.id))
-        await conn.commit()
-
-async def update_game_in_db() -> None:
-    async with aiosqlite.connect(SQLITE_PATH) as conn:
-        await conn.execute("UPDATE game SET round=?, started=?, history=?", (game.round, game.started, json.dumps(game.history)))
-        await conn.commit()
-
-async def load_game(conn: aiosqlite.Connection):
-    async with conn.cursor() as cur:
-        await cur.execute("SELECT * FROM game")
-        row = await cur.fetchone()
-    if not row:
-        await conn.execute("INSERT INTO game (round, started, history) VALUES (?, ?, ?)", (game.round, game.started, json.dumps(game.history)))
-        await conn.commit()
-    else:
-        game.round, game.started, game.history = row
-        game.history = json.loads(game.history)
-
-async def load_teams(conn: aiosqlite.Connection):
-    async with conn.cursor() as cur:
-        await cur.execute("SELECT * FROM teams")
-        rows = await cur.fetchall()
-        for row in rows:
-            user_teams[row[2]] = Team(*row)
-            user_teams[row[2]].quiz_answers = json.loads(row[7])
+def render_positions(history: dict[str, dict[str, tuple]]) -> str:
+    text = "\nКомпании:"
+    for position in ALL_POSITIONS:
+        position_history = history.get(position.id, None)
+        if not position_history:
+            continue
+        text += f"\n\n{position.name}:\n" + "\n".join([f"{round}. {round_data[1]}x ({round_data[0]})" for round, round_data in position_history.items()])
+    return text
 
 async def broadcast(
+        instance: GameInstance,
         text: str,
         markup: InlineKeyboardMarkup | None = None,
-        photo: InputFile | None = None
-) -> None:
-    tasks = [
-        bot.send_message(team.owner_id, text, reply_markup=markup)
-        if not photo else bot.send_photo(team.owner_id, photo, caption=text)
-        for team in user_teams.values()
-    ]
-    await asyncio.gather(*tasks)
-
-def get_creds():
-    creds = Credentials.from_service_account_file("creds.json")
-    scoped = creds.with_scopes([
-        'https://www.googleapis.com/auth/spreadsheets',
-        'https://www.googleapis.com/auth/drive'
-    ])
-    return scoped
+        photo: str | None = None
+) -> BroadcastReport:
+    return await broadcaster.broadcast(instance.teams.owner_ids(), text, markup, photo)
 
 async def main():
-    global agcm
+    # Without the secret aiogram accepts any POST, anyone reaching the port could send updates as an admin
+    if RUN_MODE == "webhook" and not WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_SECRET must be set when RUN_MODE=webhook")
     if not os.path.exists(os.getcwd() + "/data"):
         os.mkdir("data")
-    async with aiosqlite.connect(SQLITE_PATH) as conn:
-        await conn.execute("CREATE TABLE IF NOT EXISTS qrcodes (id TEXT PRIMARY KEY, activated BOOL DEFAULT FALSE)")
-        await conn.execute("CREATE TABLE IF NOT EXISTS teams (id TEXT PRIMARY KEY, name TEXT NOT NULL, owner_id BIGINT NOT NULL, asset_1 FLOAT NOT NULL, asset_2 FLOAT NOT NULL, choice_1 TEXT, choice_2 TEXT, quiz_answers JSON NOT NULL)")
-        await conn.execute("CREATE TABLE IF NOT EXISTS game (round INT NOT NULL, started BOOL NOT NULL, history JSON NOT NULL)")
-
-        await load_game(conn)
-        await load_teams(conn)
-        await conn.commit()
-    agcm = AsyncioGspreadClientManager(get_creds)
-    await dp.start_polling(bot)
+    # One Sheets client for all games, gspread_asyncio keeps it authorized and the quota is shared
+    make_agcm = cache(lambda: service_account_manager("creds.json", SHEETS_REQUESTS_PER_MINUTE))
+    for config in GAMES:
+        instance = GameInstance(config)
+        await instance.open(make_agcm)
+        games.add(instance)
+    metrics.gauge("games_running", lambda: len(games))
+    metrics.gauge("teams_registered", lambda: sum(len(instance.teams) for instance in games))
+    metrics.gauge("journal_pending_events", lambda: sum(instance.db.pending_events for instance in games))
+    metrics.gauge("broadcast_queued_messages", lambda: broadcaster.queued)
+    metrics.gauge("sheets_dirty", lambda: sum(instance.sheets.dirty for instance in games if instance.sheets))
+    metrics_server = await start_metrics_server(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+    try:
+        if RUN_MODE == "webhook":
+            await run_webhook(dp, bot, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, UPDATES_CONCURRENCY, WEBHOOK_URL)
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot, tasks_concurrency_limit=UPDATES_CONCURRENCY)
+    finally:
+        # Databases of all games are closed first, together: a stop grace period of a few seconds may run out
+        # during the Sheets flushes or the round results still being delivered
+        await asyncio.gather(*(instance.close() for instance in games))
+        await broadcaster.join()
+        qr_renderer.close()
+        if metrics_server:
+            await metrics_server.cleanup()
 
 if __name__ == "__main__":
     asyncio.run(main())
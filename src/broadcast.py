@@ -0,0 +1,174 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Iterable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter, TelegramNetworkError, TelegramServerError
+from aiogram.types import InlineKeyboardMarkup
+
+from src.metrics import metrics
+
+
+class TokenBucket:
+
+    def __init__(self, rate: float, capacity: int | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class BroadcastReport:
+    total: int = 0
+    delivered: int = 0
+    failed: int = 0
+    retries: int = 0
+    errors: dict[int, str] = field(default_factory=dict) # chat_id: error
+
+    @property
+    def done(self) -> bool:
+        return self.delivered + self.failed == self.total
+
+    def __add__(self, other: "BroadcastReport") -> "BroadcastReport":
+        return BroadcastReport(
+            self.total + other.total,
+            self.delivered + other.delivered,
+            self.failed + other.failed,
+            self.retries + other.retries,
+            self.errors | other.errors
+        )
+
+    def __str__(self):
+        return f"Доставлено: {self.delivered}/{self.total}, ошибок: {self.failed}"
+
+
+class Broadcaster:
+    # Telegram allows ~30 messages per second overall and about one per second per chat
+
+    def __init__(
+            self,
+            bot: Bot,
+            rate: float = 25,
+            chat_interval: float = 1,
+            concurrency: int = 20,
+            max_retries: int = 3,
+            backoff: float = 0.5
+    ):
+        self.bot = bot
+        self.bucket = TokenBucket(rate)
+        self.chat_interval = chat_interval
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.queued = 0 # messages waiting for a free worker
+        self._background: set[asyncio.Task] = set()
+        self._chat_next_send: dict[int, float] = {}
+
+    async def broadcast(
+            self,
+            chat_ids: Iterable[int],
+            text: str,
+            markup: InlineKeyboardMarkup | None = None,
+            photo: str | None = None # file_id of a photo Telegram already stores, sent without re-uploading
+    ) -> BroadcastReport:
+        chat_ids = list(chat_ids)
+        report = BroadcastReport()
+        if not photo:
+            return await self.run([(chat_id, lambda chat_id=chat_id: self.bot.send_message(chat_id, text, reply_markup=markup)) for chat_id in chat_ids], report)
+        return await self.run([(chat_id, lambda chat_id=chat_id: self.bot.send_photo(chat_id, photo, caption=text)) for chat_id in chat_ids], report)
+
+    async def send_each(self, messages: Iterable[tuple[int, str]]) -> BroadcastReport:
+        # Personal texts, one per chat, under the same rate limits as a broadcast
+        return await self.run([(chat_id, lambda chat_id=chat_id, text=text: self.bot.send_message(chat_id, text)) for chat_id, text in messages])
+
+    def send_each_in_background(self, messages: Iterable[tuple[int, str]]) -> BroadcastReport:
+        # Returns at once, the report is filled in while the messages are being delivered
+        jobs = [(chat_id, lambda chat_id=chat_id, text=text: self.bot.send_message(chat_id, text)) for chat_id, text in messages]
+        report = BroadcastReport(total=len(jobs))
+        task = asyncio.create_task(self._run_timed(jobs, report))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return report
+
+    async def join(self) -> None:
+        # Waits for the background deliveries, e.g. before the bot session is closed
+        while self._background:
+            await asyncio.gather(*self._background)
+
+    async def _run_timed(self, jobs: list[tuple[int, Callable[[], Awaitable]]], report: BroadcastReport) -> None:
+        with metrics.timer("broadcast_background_seconds"):
+            await self._run(jobs, report)
+
+    async def run(self, jobs: list[tuple[int, Callable[[], Awaitable]]], report: BroadcastReport | None = None) -> BroadcastReport:
+        report = report or BroadcastReport()
+        report.total += len(jobs)
+        await self._run(jobs, report)
+        return report
+
+    async def _run(self, jobs: list[tuple[int, Callable[[], Awaitable]]], report: BroadcastReport) -> None:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def worker(chat_id: int, job: Callable[[], Awaitable]):
+            self.queued += 1
+            async with semaphore:
+                self.queued -= 1
+                error = await self._deliver(chat_id, job, report)
+            if error is None:
+                report.delivered += 1
+            else:
+                report.failed += 1
+                metrics.inc("broadcast_failures_total")
+                report.errors[chat_id] = error
+
+        await asyncio.gather(*(worker(chat_id, job) for chat_id, job in jobs))
+
+    async def _deliver(self, chat_id: int, job: Callable[[], Awaitable], report: BroadcastReport) -> str | None:
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                report.retries += 1
+                metrics.inc("broadcast_retries_total")
+            await self._wait_for_chat(chat_id)
+            await self.bucket.acquire()
+            try:
+                await job()
+                return None
+            except TelegramRetryAfter as e:
+                self.bucket.pause(e.retry_after)
+                error = e.message
+            except (TelegramNetworkError, TelegramServerError) as e:
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+                error = e.message
+            except TelegramAPIError as e:
+                return e.message
+            except Exception as e:
+                return repr(e)
+        return error
+
+    async def _wait_for_chat(self, chat_id: int) -> None:
+        now = time.monotonic()
+        send_at = max(now, self._chat_next_send.get(chat_id, 0))
+        self._chat_next_send[chat_id] = send_at + self.chat_interval
+        if send_at > now:
+            await asyncio.sleep(send_at - now)
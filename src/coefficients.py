@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+from typing import Callable, Iterable, Sequence
+
+from src.config import ALL_POSITIONS
+from src.models import RoundPosition
+from src.table import POSITION_INDEX
+
+TABLE_SIZE = 2048 # investor counts with a precomputed coefficient, both assets of 1024 teams
+
+Band = tuple[int, int | None, float] # from_N, to_N (None for open-ended), coefficient
+
+
+@dataclass(slots=True)
+class CompiledPosition:
+    # Coefficient of a position as a lookup by investor count N, built once at startup
+
+    position: RoundPosition
+    index: int # in the vector of counts
+    table: tuple[float | None, ...] = () # N: coefficient
+    tail: Callable[[int], float | None] = lambda _: None # N past the table
+    mother: int | None = None
+
+    def coefficient(self, counts: Sequence[int], custom_coefficient: float | None = None) -> float | None:
+        invests = counts[self.index]
+        if self.mother is not None:
+            if not invests:
+                return 1
+            return round((counts[self.mother] / invests) or 1, 2)
+        if self.position.custom_coefficient is not None:
+            return custom_coefficient # set by the admin of the game on /stop
+        if invests < len(self.table):
+            return self.table[invests]
+        return self.tail(invests)
+
+
+def check_bands(position: RoundPosition) -> list[Band]:
+    # Bands must cover every N from 1 up without overlapping, the last one open-ended
+    bands = sorted(((start, end, coefficient) for (start, end), coefficient in position.nonlinear_coefficients.items()),
+                   key=lambda band: band[0])
+    expected = min(bands[0][0], 1) if bands else 1
+    for i, (start, end, _) in enumerate(bands):
+        if end is not None and end < start:
+            raise ValueError(f"{position.id}: band {start}-{end} is empty")
+        if start > expected:
+            raise ValueError(f"{position.id}: no coefficient for N from {expected} to {start - 1}")
+        if start < expected:
+            raise ValueError(f"{position.id}: band {start}-{end or ''} overlaps the previous one")
+        if end is None and i != len(bands) - 1:
+            raise ValueError(f"{position.id}: open-ended band {start}- is not the last one")
+        expected = end + 1 if end is not None else None
+    if expected is not None:
+        raise ValueError(f"{position.id}: no coefficient for N from {expected}")
+    return bands
+
+def compile_position(position: RoundPosition) -> CompiledPosition:
+    compiled = CompiledPosition(position, POSITION_INDEX[position.id])
+    if position.linear_coefficient is not None:
+        linear = position.linear_coefficient
+        compiled.table = tuple(round(linear(n), 2) for n in range(TABLE_SIZE))
+        compiled.tail = lambda n: round(linear(n), 2)
+    elif position.nonlinear_coefficients is not None:
+        bands = check_bands(position)
+        table = [None] * bands[-1][0]
+        for start, end, coefficient in bands[:-1]:
+            table[start:end + 1] = [coefficient] * (end + 1 - start)
+        compiled.table = tuple(table)
+        tail = bands[-1][2]
+        compiled.tail = lambda _: tail
+    elif position.coefficient_from_mother is not None:
+        compiled.mother = POSITION_INDEX[position.coefficient_from_mother]
+    return compiled
+
+def round_coefficients(
+        positions: Iterable[RoundPosition],
+        counts: Sequence[int],
+        custom_coefficient: float | None = None
+) -> list[float | None]:
+    # counts are indexed like POSITION_IDS, as returned by TeamTable.count_invests
+    return [COMPILED_POSITIONS[position.id].coefficient(counts, custom_coefficient) for position in positions]
+
+
+COMPILED_POSITIONS = {position.id: compile_position(position) for position in ALL_POSITIONS}
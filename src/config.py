@@ -1,17 +1,31 @@
+import json
 import os
+import re
 
 import dotenv
 
-from src.models import RoundPosition
+from src.models import RoundPosition, GameConfig
 
 dotenv.load_dotenv()
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
-ADMIN_IDS = list(map(int, os.getenv("ADMIN_IDS").split(";")))
+ADMIN_IDS = [int(admin_id) for admin_id in os.getenv("ADMIN_IDS", "").split(";") if admin_id]
 SHEET_URL = os.getenv("SHEET_URL")
+GAMES_PATH = os.getenv("GAMES_PATH") # json with the games hosted at once, a single game from ADMIN_IDS and SHEET_URL if empty
 
 SQLITE_PATH = "data/database.db"
 
+RUN_MODE = os.getenv("RUN_MODE", "polling") # polling or webhook
+UPDATES_CONCURRENCY = int(os.getenv("UPDATES_CONCURRENCY", "100")) # updates processed at the same time
+WEBHOOK_URL = os.getenv("WEBHOOK_URL") # public https base url, the webhook is not registered in Telegram if empty
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") # required in webhook mode
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1") # behind a reverse proxy
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100")) # Prometheus endpoint, 0 disables it
+SHEETS_REQUESTS_PER_MINUTE = int(os.getenv("SHEETS_REQUESTS_PER_MINUTE", "60")) # Google Sheets API quota of the service account
+
 tbank = RoundPosition(id="tbank", name="Т-Банк", linear_coefficient=lambda _: 1.1)
 sibur = RoundPosition(id="sibur", name='Сибур', linear_coefficient=lambda n: 25 / (n or 1))
 vk = RoundPosition(id="vk", name='VK', linear_coefficient=lambda n: 15 / (n or 1))
@@ -41,8 +55,8 @@ djara = RoundPosition(
     id="djara",
     name="Djara",
     nonlinear_coefficients={
-        (4, 7): 10,
         (1, 3): 0.8,
+        (4, 7): 10,
         (8, None): 0.8
     }
 )
@@ -107,8 +121,34 @@ ROUNDS = [
     ]
 ]
 
+POSITIONS_BY_ID = {position.id: position for position in ALL_POSITIONS}
+
+
+def load_games(path: str | None) -> list[GameConfig]:
+    if not path:
+        return [GameConfig("main", ADMIN_IDS, SHEET_URL, SQLITE_PATH, ROUNDS)]
+    with open(path, encoding="utf-8") as f:
+        games = json.load(f)
+    configs = []
+    for game in games:
+        if not re.fullmatch(r"\w+", game["id"], re.ASCII) or any(config.id == game["id"] for config in configs):
+            raise ValueError(f"Game id {game['id']!r} is not unique or not made of letters, digits and _")
+        unknown = {pos_id for positions in game.get("rounds", ()) for pos_id in positions} - POSITIONS_BY_ID.keys()
+        if unknown:
+            raise ValueError(f"Game {game['id']}: unknown positions {', '.join(sorted(unknown))}")
+        configs.append(GameConfig(
+            id=game["id"],
+            admin_ids=game["admin_ids"],
+            sheet_url=game.get("sheet_url"),
+            db_path=f"data/{game['id']}.db",
+            rounds=[[POSITIONS_BY_ID[pos_id] for pos_id in positions] for positions in game["rounds"]] if "rounds" in game else ROUNDS
+        ))
+    return configs
+
 QUIZ_QUESTIONS = [
     ("В переводе с одного из языков название этой компании означает чувство зависти. И действительно, продукты компании пережили такой резкий скачок цен в 2021 году, что некоторые эксперты окрестили этот период зеленой лихорадкой. Впрочем, сложно сказать, что лихорадка закончилась и сейчас - капитализация компании бьет новые рекорды.\n\nНазовите компанию", ("nvidia", "нвидиа", "нвидия")),
     ("В японских садах принято любоваться сакурой, не срывая цветы. Так и некоторые инвесторы предпочитают лишь наблюдать, как на их счёт регулярно «падают лепестки», ведь иногда цветение может происходить до 4 раз в год. Как одним словом они называют эти «лепестки»?", ("дивиденды", ))
 ]
-QUIZ_BONUS_COEFFICIENTS = (1.1, 1.21) # count of correct answers
\ No newline at end of file
+QUIZ_BONUS_COEFFICIENTS = (1.1, 1.21) # count of correct answers
+
+GAMES = load_games(GAMES_PATH)
\ No newline at end of file
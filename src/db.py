@@ -0,0 +1,276 @@
+import asyncio
+import json
+import logging
+import secrets
+from typing import Callable, Iterable
+
+import aiosqlite
+
+from src.journal import Event, apply_event, dump_state, load_state
+from src.metrics import metrics
+from src.models import Team, Game
+
+logger = logging.getLogger(__name__)
+
+CREATE_QRCODES = "CREATE TABLE IF NOT EXISTS qrcodes (id TEXT PRIMARY KEY, activated BOOL DEFAULT FALSE)"
+CREATE_EVENTS = "CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT NOT NULL, data JSON NOT NULL)"
+CREATE_SNAPSHOTS = "CREATE TABLE IF NOT EXISTS snapshots (seq INTEGER PRIMARY KEY, state JSON NOT NULL)"
+# Tables of the row-per-team layout, only read once to migrate old databases into the journal
+CREATE_TEAMS = "CREATE TABLE IF NOT EXISTS teams (id TEXT PRIMARY KEY, name TEXT NOT NULL, owner_id BIGINT NOT NULL, asset_1 FLOAT NOT NULL, asset_2 FLOAT NOT NULL, choice_1 TEXT, choice_2 TEXT, quiz_answers JSON NOT NULL)"
+CREATE_GAME = "CREATE TABLE IF NOT EXISTS game (round INT NOT NULL, started BOOL NOT NULL, history JSON NOT NULL)"
+# One row per position per settled round, written by /stop for analytics; the game state itself lives in the journal
+CREATE_ROUND_RESULTS = "CREATE TABLE IF NOT EXISTS round_results (round INT NOT NULL, position TEXT NOT NULL, invests INT NOT NULL, coefficient FLOAT, invested FLOAT, PRIMARY KEY (round, position))"
+CREATE_ROUND_RESULTS_POSITION = "CREATE INDEX IF NOT EXISTS round_results_position ON round_results (position, round)"
+
+# Schema versions, tracked in PRAGMA user_version: a database only runs the migrations it has not seen yet
+MIGRATIONS = (
+    (CREATE_QRCODES, CREATE_TEAMS, CREATE_GAME),
+    (CREATE_EVENTS, CREATE_SNAPSHOTS),
+    (CREATE_ROUND_RESULTS, CREATE_ROUND_RESULTS_POSITION),
+)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Statements are kept constant so sqlite3 reuses its prepared statement cache on the long-lived connection
+INSERT_EVENT = "INSERT INTO events (type, data) VALUES (?, ?)"
+LAST_EVENT_SEQ = "SELECT seq FROM sqlite_sequence WHERE name='events'"
+INSERT_SNAPSHOT = "INSERT OR REPLACE INTO snapshots (seq, state) VALUES (?, ?)"
+# The latest snapshot (with a NULL type) followed by the events after it, read in one pass
+SELECT_STATE = (
+    "SELECT * FROM (SELECT seq, NULL, state FROM snapshots ORDER BY seq DESC LIMIT 1) "
+    "UNION ALL SELECT seq, type, data FROM events WHERE seq > (SELECT IFNULL(MAX(seq), 0) FROM snapshots) "
+    "ORDER BY 1"
+)
+INSERT_SNAPSHOT_IF_MISSING = "INSERT INTO snapshots (seq, state) SELECT 0, ? WHERE NOT EXISTS (SELECT 1 FROM snapshots)"
+DELETE_EVENTS = "DELETE FROM events WHERE seq <= ?"
+DELETE_SNAPSHOTS = "DELETE FROM snapshots WHERE seq < ?"
+SELECT_TEAMS = "SELECT * FROM teams"
+SELECT_GAME = "SELECT * FROM game"
+SELECT_QRCODES = "SELECT id, activated FROM qrcodes"
+# Checks and activates in one statement on the primary key, only one of two concurrent claims gets a row back
+CLAIM_QRCODE = "UPDATE qrcodes SET activated=1 WHERE id=? AND activated=0 RETURNING id"
+INSERT_QRCODE = "INSERT INTO qrcodes (id) VALUES (?)"
+QRCODE_BYTES = 3 # 6 hex characters, printed on the QR codes and used as the team id
+MAX_QRCODES = 256 ** QRCODE_BYTES // 2 # random new codes are still found quickly up to half of the space
+INSERT_ROUND_RESULT = "INSERT OR REPLACE INTO round_results VALUES (?, ?, ?, ?, ?)"
+BACKFILL_ROUND_RESULT = "INSERT OR IGNORE INTO round_results VALUES (?, ?, ?, ?, NULL)"
+POSITION_STATS = (
+    "SELECT position, COUNT(*), SUM(invests), SUM(coefficient), COUNT(coefficient), SUM(invested) "
+    "FROM round_results GROUP BY position"
+)
+
+RoundResult = tuple[int, str, int, float | None, float] # round, position id, investors, coefficient, invested assets
+PositionStats = tuple[str, int, int, float | None, int, float | None] # position id, rounds, investors, coefficient sum and count, invested
+
+
+class Database:
+    # Game state is an append-only event journal; a snapshot of the whole state is taken every `snapshot_every`
+    # events and the events it covers are deleted, so recovery replays at most that many events
+
+    def __init__(self, path: str, flush_interval: float = 0.5, snapshot_every: int = 5000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self.conn: aiosqlite.Connection | None = None
+        self._pending_events: list[tuple[str, str]] = []
+        self._events_since_snapshot = 0
+        self._game: Game | None = None
+        self._get_teams: Callable[[], Iterable[Team]] | None = None
+        self._lock = asyncio.Lock() # every commit on the shared connection, so one never commits or rolls back another
+        self._flush_task: asyncio.Task | None = None
+        self._qrcodes: dict[str, bool] = {} # id: activated, all codes are kept in memory to reject bad scans without a query
+
+    async def connect(self) -> None:
+        self.conn = await aiosqlite.connect(self.path)
+        await self.conn.execute("PRAGMA journal_mode=WAL")
+        await self.conn.execute("PRAGMA synchronous=NORMAL")
+        await self._migrate()
+        async with self.conn.execute(SELECT_QRCODES) as cur:
+            self._qrcodes = {qr_id: bool(activated) async for qr_id, activated in cur}
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._game is not None:
+            await self.snapshot()
+        else:
+            await self.flush()
+        await self.conn.close()
+
+    # Journal
+
+    @property
+    def pending_events(self) -> int:
+        return len(self._pending_events)
+
+    def append(self, *events: Event) -> None:
+        # Hot path: events are serialized right away and written by the next flush
+        for event_type, data in events:
+            self._pending_events.append((event_type, json.dumps(data)))
+
+    async def write(self, *events: Event, round_results: Iterable[RoundResult] = ()) -> None:
+        # For events that must survive a crash as soon as the handler returns
+        self.append(*events)
+        await self.flush(round_results)
+
+    async def flush(self, round_results: Iterable[RoundResult] = ()) -> None:
+        async with self._lock:
+            round_results = list(round_results)
+            if not self._pending_events and not round_results:
+                return
+            events, self._pending_events = self._pending_events, []
+            with metrics.timer("sqlite_commit_seconds", kind="flush"):
+                try:
+                    await self.conn.executemany(INSERT_EVENT, events)
+                    # Analytics rows of a settled round are committed together with its events
+                    await self.conn.executemany(INSERT_ROUND_RESULT, round_results)
+                    await self.conn.commit()
+                except Exception:
+                    # Nothing of a failed flush is committed, its events go to the next one
+                    await self.conn.rollback()
+                    self._pending_events[:0] = events
+                    raise
+            metrics.inc("journal_events_total", len(events))
+            self._events_since_snapshot += len(events)
+        if self._game is not None and self._events_since_snapshot >= self.snapshot_every:
+            await self.snapshot()
+
+    async def snapshot(self) -> None:
+        async with self._lock:
+            # The state and the events that led to it are taken in the same step, so the snapshot matches its seq
+            state = dump_state(self._game, self._get_teams())
+            events, self._pending_events = self._pending_events, []
+            with metrics.timer("sqlite_commit_seconds", kind="snapshot"):
+                await self.conn.executemany(INSERT_EVENT, events)
+                async with self.conn.execute(LAST_EVENT_SEQ) as cur:
+                    row = await cur.fetchone()
+                seq = row[0] if row else 0
+                await self.conn.execute(INSERT_SNAPSHOT, (seq, state))
+                await self.conn.execute(DELETE_EVENTS, (seq,))
+                await self.conn.execute(DELETE_SNAPSHOTS, (seq,))
+                await self.conn.commit()
+            metrics.inc("journal_events_total", len(events))
+            self._events_since_snapshot = 0
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # A failed flush is rolled back with its events requeued, the next pass retries them
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Journal flush failed")
+                metrics.inc("sqlite_errors_total")
+
+    async def load_state(self, game: Game) -> list[Team]:
+        teams = {}
+        async with self.conn.execute(SELECT_STATE) as cur:
+            async for _, event_type, data in cur:
+                if event_type is None:
+                    teams = load_state(data, game)
+                else:
+                    apply_event(game, teams, event_type, json.loads(data))
+                    self._events_since_snapshot += 1
+        return list(teams.values())
+
+    def track(self, game: Game, get_teams: Callable[[], Iterable[Team]]) -> None:
+        # Snapshots are taken from the live state once it is loaded
+        self._game = game
+        self._get_teams = get_teams
+
+    # Schema
+
+    async def _migrate(self) -> None:
+        async with self.conn.execute("PRAGMA user_version") as cur:
+            version, = await cur.fetchone()
+        if version >= SCHEMA_VERSION:
+            return
+        for statements in MIGRATIONS[version:]:
+            for statement in statements:
+                await self.conn.execute(statement)
+        if version < 2:
+            await self._migrate_legacy_state()
+        await self.conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        await self.conn.commit()
+
+    async def _migrate_legacy_state(self) -> None:
+        # The rows of the row-per-team layout become the snapshot the journal starts from
+        teams = []
+        async with self.conn.execute(SELECT_TEAMS) as cur:
+            async for row in cur:
+                team = Team(*row)
+                team.quiz_answers = json.loads(row[7])
+                teams.append(team)
+        async with self.conn.execute(SELECT_GAME) as cur:
+            row = await cur.fetchone()
+        if not teams and not row:
+            return
+        game = Game()
+        if row:
+            game.round, game.started, game.history = row[0], bool(row[1]), json.loads(row[2])
+        await self.conn.execute(INSERT_SNAPSHOT_IF_MISSING, (dump_state(game, teams),))
+
+    # Round results
+
+    async def backfill_round_results(self, history: dict[str, dict[str, tuple]]) -> None:
+        # Rounds settled before the table existed, known from the journal without the invested assets
+        rows = [
+            (int(round_id), pos_id, invests, coefficient if coefficient != "-" else None)
+            for pos_id, rounds in history.items() for round_id, (invests, coefficient) in rounds.items()
+        ]
+        if rows:
+            async with self._lock:
+                await self.conn.executemany(BACKFILL_ROUND_RESULT, rows)
+                await self.conn.commit()
+
+    async def position_stats(self) -> list[PositionStats]:
+        async with self.conn.execute(POSITION_STATS) as cur:
+            return list(await cur.fetchall())
+
+    # QR codes
+
+    @property
+    def qrcodes_left(self) -> int:
+        return MAX_QRCODES - len(self._qrcodes)
+
+    def qrcode_activated(self, qr_id: str) -> bool | None:
+        # None for a code that was never issued
+        return self._qrcodes.get(qr_id)
+
+    async def claim_qrcode(self, qr_id: str) -> bool:
+        if self._qrcodes.get(qr_id) is not False:
+            return False
+        # Marked in memory before the first await, so a concurrent scan of the same code is rejected right away
+        self._qrcodes[qr_id] = True
+        # The connection is shared with the journal, a flush must not commit or roll back half of the claim
+        async with self._lock:
+            try:
+                # Executed and fetched in one step: an open RETURNING statement would block commits of other tasks
+                claimed = bool(await self.conn.execute_fetchall(CLAIM_QRCODE, (qr_id,)))
+                await self.conn.commit()
+            except Exception:
+                await self.conn.rollback()
+                self._qrcodes[qr_id] = False
+                raise
+        return claimed
+
+    async def issue_qrcodes(self, count: int) -> list[str]:
+        # New random codes, unique among all codes issued before
+        if count > self.qrcodes_left:
+            raise ValueError(f"Too many QR codes: {len(self._qrcodes)} issued, {count} requested")
+        qr_ids = set()
+        while len(qr_ids) < count:
+            qr_id = secrets.token_hex(QRCODE_BYTES)
+            if qr_id not in self._qrcodes:
+                qr_ids.add(qr_id)
+        qr_ids = list(qr_ids)
+        await self.add_qrcodes(qr_ids)
+        return qr_ids
+
+    async def add_qrcodes(self, qr_ids: Iterable[str]) -> None:
+        qr_ids = list(qr_ids)
+        async with self._lock:
+            await self.conn.executemany(INSERT_QRCODE, [(qr_id,) for qr_id in qr_ids])
+            await self.conn.commit()
+        self._qrcodes.update(dict.fromkeys(qr_ids, False))
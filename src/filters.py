@@ -1,10 +1,17 @@
 from aiogram.filters import BaseFilter
 from aiogram.types import Message
 
-from src.config import ADMIN_IDS
+from src.games import Games
 
 
 class IsAdminFilter(BaseFilter):
+    # Passes the game the admin currently manages to the handler as `instance`
 
-    async def __call__(self, message: Message) -> bool:
-        return message.from_user.id in ADMIN_IDS
\ No newline at end of file
+    def __init__(self, games: Games):
+        self.games = games
+
+    async def __call__(self, message: Message) -> bool | dict:
+        instance = self.games.of_admin(message.from_user.id)
+        if instance is None:
+            return False
+        return {"instance": instance}
@@ -0,0 +1,132 @@
+import asyncio
+from typing import Callable, Iterator, TypeVar, TYPE_CHECKING
+
+from aiogram.types import InlineKeyboardMarkup
+
+from src.broadcast import BroadcastReport
+from src.db import Database
+from src.keyboards import create_round_keyboard, build_round_keyboards
+from src.locks import ShardedLock
+from src.models import Game, GameConfig, Team
+from src.registry import TeamRegistry
+from src.sheets import SheetsSync, position_cells
+
+if TYPE_CHECKING:
+    from gspread_asyncio import AsyncioGspreadClientManager
+
+T = TypeVar("T")
+
+
+class GameInstance:
+    # Everything one event owns: state, locks, journal and sheet. The bot, the broadcaster, the QR pool
+    # and the Sheets client are shared by all games of the process
+
+    def __init__(self, config: GameConfig):
+        self.config = config
+        self.id = config.id
+        self.rounds = config.rounds
+        self.round_positions = [{position.id: position for position in positions} for positions in config.rounds] # round - 1: id: position
+        self._round_keys = build_round_keyboards(config.rounds)
+        self.game = Game()
+        self.teams = TeamRegistry()
+        # Team state is changed under the shard of its team id (QR code id before registration),
+        # game phase transitions (/next, /stop, quiz) are serialized by phase_lock
+        self.team_locks = ShardedLock()
+        self.phase_lock = asyncio.Lock()
+        self.db = Database(config.db_path)
+        self.sheets: SheetsSync | None = None # None for a game without sheet_url
+        self.results_delivery: BroadcastReport | None = None # round results of the last /stop, filled in as they are sent
+        self._rendered: dict[str, object] = {} # built from the round history, dropped when a round settles
+
+    async def open(self, make_agcm: Callable[[], "AsyncioGspreadClientManager"], sheets_debounce: float = 3) -> None:
+        await self.db.connect()
+        for team in await self.db.load_state(self.game):
+            self.teams.add(team)
+        self.db.track(self.game, self.teams.values)
+        await self.db.backfill_round_results(self.game.history)
+        if not self.config.sheet_url:
+            return # played without a sheet, nothing to sync
+        self.sheets = SheetsSync(make_agcm, self.config.sheet_url, self.teams.leaderboard.top,
+                                 lambda: self.rendered("sheet_positions", lambda: position_cells(self.game.history)),
+                                 debounce=sheets_debounce)
+        self.sheets.start()
+
+    async def close(self) -> None:
+        # The journal is the durable state, it is flushed and snapshotted before the sheet that may wait out an outage
+        await self.db.close()
+        if self.sheets:
+            await self.sheets.close()
+
+    def rendered(self, key: str, render: Callable[[], T]) -> T:
+        if key not in self._rendered:
+            self._rendered[key] = render()
+        return self._rendered[key]
+
+    def round_settled(self) -> None:
+        self._rendered.clear()
+
+    def round_keyboard(self, asset_id: int, selected_pos: str | None) -> InlineKeyboardMarkup:
+        return create_round_keyboard(self._round_keys[self.game.round - 1], self.game.round, asset_id, selected_pos)
+
+
+class Games:
+    # Games of the process with the indexes handlers use to find the game of an update
+
+    def __init__(self):
+        self._by_id: dict[str, GameInstance] = {}
+        self._by_owner: dict[int, GameInstance] = {}
+        self._by_admin: dict[int, list[GameInstance]] = {}
+        self._selected: dict[int, GameInstance] = {} # admin id: game chosen with /game
+        # A user may only join one game, registrations of the same user in different games are serialized here
+        self.owner_locks = ShardedLock()
+
+    @property
+    def default(self) -> GameInstance:
+        # QR codes printed before games had ids belong to the first game
+        return next(iter(self._by_id.values()))
+
+    def add(self, instance: GameInstance) -> None:
+        self._by_id[instance.id] = instance
+        for admin_id in instance.config.admin_ids:
+            self._by_admin.setdefault(admin_id, []).append(instance)
+        for team in instance.teams:
+            self._by_owner[team.owner_id] = instance
+
+    def remove(self, instance: GameInstance) -> None:
+        del self._by_id[instance.id]
+        for admin_id in instance.config.admin_ids:
+            self._by_admin[admin_id].remove(instance)
+            if not self._by_admin[admin_id]:
+                del self._by_admin[admin_id]
+            if self._selected.get(admin_id) is instance:
+                del self._selected[admin_id]
+        for team in instance.teams:
+            self._by_owner.pop(team.owner_id, None)
+
+    def add_team(self, instance: GameInstance, team: Team) -> None:
+        instance.teams.add(team)
+        self._by_owner[team.owner_id] = instance
+
+    def by_id(self, game_id: str) -> GameInstance | None:
+        return self._by_id.get(game_id)
+
+    def by_owner(self, owner_id: int) -> GameInstance | None:
+        return self._by_owner.get(owner_id)
+
+    def of_admin(self, admin_id: int) -> GameInstance | None:
+        games = self._by_admin.get(admin_id)
+        if not games:
+            return None
+        return self._selected.get(admin_id, games[0])
+
+    def admin_games(self, admin_id: int) -> list[GameInstance]:
+        return self._by_admin.get(admin_id, [])
+
+    def select(self, admin_id: int, instance: GameInstance) -> None:
+        self._selected[admin_id] = instance
+
+    def __iter__(self) -> Iterator[GameInstance]:
+        return iter(self._by_id.values())
+
+    def __len__(self) -> int:
+        return len(self._by_id)
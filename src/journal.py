@@ -0,0 +1,86 @@
+import json
+from dataclasses import asdict
+from typing import Iterable
+
+from src.models import Team, Game
+
+# Every event sets values instead of changing them relatively, so replaying an event twice is harmless
+REGISTER = "register"
+RENAME = "rename"
+CHOICE = "choice"
+ASSETS = "assets"
+PHASE = "phase"
+SETTLE = "settle"
+QUIZ_ANSWER = "quiz_answer"
+QUIZ_RESULTS = "quiz_results"
+
+Event = tuple[str, dict]
+
+
+def team_registered(team: Team) -> Event:
+    return REGISTER, {"id": team.id, "name": team.name, "owner_id": team.owner_id}
+
+def team_renamed(team: Team) -> Event:
+    return RENAME, {"id": team.id, "name": team.name}
+
+def choice_made(team: Team, asset: int) -> Event:
+    return CHOICE, {"id": team.id, "asset": asset, "pos": team.choice_1 if asset == 1 else team.choice_2}
+
+def assets_changed(team: Team) -> Event:
+    return ASSETS, {"id": team.id, "assets": [team.asset_1, team.asset_2]}
+
+def phase_changed(game: Game) -> Event:
+    return PHASE, {"round": game.round, "started": game.started, "wait_for_coefficient": game.wait_for_coefficient, "quiz_started": game.quiz_started}
+
+def round_settled(game: Game, teams: Iterable[Team]) -> Event:
+    return SETTLE, {
+        "round": game.round,
+        "assets": {team.id: [team.asset_1, team.asset_2] for team in teams},
+        "history": {pos_id: rounds[str(game.round)] for pos_id, rounds in game.history.items() if str(game.round) in rounds}
+    }
+
+def quiz_answered(team: Team) -> Event:
+    return QUIZ_ANSWER, {"id": team.id, "index": len(team.quiz_answers) - 1, "answer": team.quiz_answers[-1], "correct": team.quiz_correct}
+
+def quiz_settled(teams: Iterable[Team]) -> Event:
+    return QUIZ_RESULTS, {"assets": {team.id: [team.asset_1, team.asset_2] for team in teams}}
+
+
+def apply_event(game: Game, teams: dict[str, Team], event_type: str, data: dict) -> None:
+    if event_type == REGISTER:
+        teams.setdefault(data["id"], Team(data["id"], data["name"], data["owner_id"]))
+    elif event_type == RENAME:
+        teams[data["id"]].name = data["name"]
+    elif event_type == CHOICE:
+        setattr(teams[data["id"]], f"choice_{data['asset']}", data["pos"])
+    elif event_type == ASSETS:
+        teams[data["id"]].asset_1, teams[data["id"]].asset_2 = data["assets"]
+    elif event_type == PHASE:
+        game.round, game.started = data["round"], data["started"]
+        game.wait_for_coefficient, game.quiz_started = data["wait_for_coefficient"], data["quiz_started"]
+    elif event_type == SETTLE:
+        for team in teams.values():
+            team.choice_1 = team.choice_2 = None
+        for team_id, assets in data["assets"].items():
+            teams[team_id].asset_1, teams[team_id].asset_2 = assets
+        for pos_id, round_data in data["history"].items():
+            game.history.setdefault(pos_id, {})[str(data["round"])] = round_data
+    elif event_type == QUIZ_ANSWER:
+        teams[data["id"]].quiz_answers[data["index"]:] = [data["answer"]]
+        teams[data["id"]].quiz_correct = data["correct"]
+    elif event_type == QUIZ_RESULTS:
+        for team_id, assets in data["assets"].items():
+            teams[team_id].asset_1, teams[team_id].asset_2 = assets
+            teams[team_id].quiz_answers.clear()
+            teams[team_id].quiz_correct = 0
+    else:
+        raise ValueError(f"Unknown event type: {event_type}")
+
+def dump_state(game: Game, teams: Iterable[Team]) -> str:
+    return json.dumps({"game": asdict(game), "teams": [asdict(team) for team in teams]})
+
+def load_state(state: str, game: Game) -> dict[str, Team]:
+    state = json.loads(state)
+    for name, value in state["game"].items():
+        setattr(game, name, value)
+    return {row["id"]: Team(**row) for row in state["teams"]}
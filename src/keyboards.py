@@ -1,11 +1,26 @@
+from functools import cache
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from src.config import ROUNDS
+from src.config import POSITIONS_BY_ID
+from src.models import RoundPosition
 
 
-def create_round_keyboard(round_id: int, asset_id: int, selected_pos: str | None) -> InlineKeyboardMarkup:
+@cache
+def create_round_keyboard(pos_ids: tuple[str, ...], round_id: int, asset_id: int, selected_pos: str | None) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
-    for position in ROUNDS[round_id - 1]:
+    for pos_id in pos_ids:
+        position = POSITIONS_BY_ID[pos_id]
         builder.add(InlineKeyboardButton(text=("✅ " if selected_pos == position.id else "") + position.name, callback_data=f"invest:{round_id}:{position.id}:{asset_id}"))
-    return builder.adjust(2).as_markup()
\ No newline at end of file
+    return builder.adjust(2).as_markup()
+
+def build_round_keyboards(rounds: list[list[RoundPosition]]) -> list[tuple[str, ...]]:
+    # All keyboards of a game are known from its rounds, so they are built once when the game is loaded;
+    # games with the same rounds share them. Returns the cache keys of the rounds
+    round_keys = [tuple(position.id for position in positions) for positions in rounds]
+    for round_id, pos_ids in enumerate(round_keys, 1):
+        for asset_id in 1, 2:
+            for selected_pos in None, *pos_ids:
+                create_round_keyboard(pos_ids, round_id, asset_id, selected_pos)
+    return round_keys
@@ -0,0 +1,49 @@
+from bisect import bisect_left, insort
+from itertools import count
+from typing import Iterable, Iterator
+
+from src.models import Team
+
+
+class Leaderboard:
+    # Teams ordered by total score, ties keep the order in which teams were added
+
+    def __init__(self, teams: Iterable[Team] = ()):
+        self._keys: list[tuple[float, int]] = [] # (-total_score, seq), sorted
+        self._teams: dict[int, Team] = {} # seq: team
+        self._entries: dict[str, tuple[float, int]] = {} # team id: current key
+        self._seq = count()
+        for team in teams:
+            self.add(team)
+
+    def add(self, team: Team) -> None:
+        key = (-team.total_score, next(self._seq))
+        self._teams[key[1]] = team
+        self._entries[team.id] = key
+        insort(self._keys, key)
+
+    def update(self, team: Team) -> None:
+        # Must be called after asset_1/asset_2 of a team were changed
+        old_key = self._entries[team.id]
+        if old_key[0] == -team.total_score:
+            return
+        del self._keys[bisect_left(self._keys, old_key)]
+        key = (-team.total_score, old_key[1])
+        self._entries[team.id] = key
+        insort(self._keys, key)
+
+    def update_many(self, teams: Iterable[Team]) -> None:
+        for team in teams:
+            self.update(team)
+
+    def rank(self, team: Team) -> int:
+        return bisect_left(self._keys, self._entries[team.id]) + 1
+
+    def top(self, k: int | None = None) -> list[Team]:
+        return [self._teams[seq] for _, seq in self._keys[:k]]
+
+    def __iter__(self) -> Iterator[Team]:
+        return (self._teams[seq] for _, seq in self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
@@ -0,0 +1,35 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Hashable, Iterable
+
+
+class ShardedLock:
+    # A fixed pool of locks, a key always maps to the same shard. Several shards are taken in index order, so there are no deadlocks
+
+    def __init__(self, shards: int = 64):
+        self._locks = [asyncio.Lock() for _ in range(shards)]
+
+    def _index(self, key: Hashable) -> int:
+        return hash(key) % len(self._locks)
+
+    def __call__(self, key: Hashable) -> asyncio.Lock:
+        return self._locks[self._index(key)]
+
+    @asynccontextmanager
+    async def many(self, keys: Iterable[Hashable]) -> AsyncIterator[None]:
+        locks = [self._locks[i] for i in sorted({self._index(key) for key in keys})]
+        acquired = []
+        try:
+            for lock in locks:
+                await lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+    @asynccontextmanager
+    async def all(self) -> AsyncIterator[None]:
+        # Barrier: waits until every in-flight keyed operation is finished and blocks new ones
+        async with self.many(range(len(self._locks))):
+            yield
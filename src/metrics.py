@@ -0,0 +1,173 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod, Response
+from aiogram.types import TelegramObject
+from aiohttp import web
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-quantile, precise enough for a summary
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    # Plain dicts keyed by (name, labels): an observation is a dict lookup and a bisect, cheap enough for the hot path
+
+    def __init__(self):
+        self.histograms: dict[tuple[str, Labels], Histogram] = {}
+        self.counters: dict[tuple[str, Labels], float] = {}
+        self.gauges: dict[str, Callable[[], float]] = {}
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(labels.items()))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(labels.items()))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name: str, get_value: Callable[[], float]) -> None:
+        self.gauges[name] = get_value
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def render(self) -> str:
+        # Prometheus text exposition format
+        lines = []
+        for name, value in sorted(self._counters_by_name().items()):
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(f"{name}{_labels(labels)} {count}" for labels, count in value)
+        for name, get_value in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {get_value()}")
+        for name, value in sorted(self._histograms_by_name().items()):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in value:
+                total = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    total += count
+                    le = "+Inf" if bound == float("inf") else str(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {total}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        lines = []
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            label = ",".join(value for _, value in labels)
+            lines.append(
+                f"{name}{f' [{label}]' if label else ''}: {histogram.count} шт., "
+                f"среднее {histogram.sum / histogram.count * 1000:.0f} мс, p50 ≤ {histogram.quantile(0.5) * 1000:g} мс, "
+                f"p99 ≤ {histogram.quantile(0.99) * 1000:g} мс"
+            )
+        for (name, labels), count in sorted(self.counters.items()):
+            label = ",".join(value for _, value in labels)
+            lines.append(f"{name}{f' [{label}]' if label else ''}: {count:g}")
+        for name, get_value in sorted(self.gauges.items()):
+            lines.append(f"{name}: {get_value():g}")
+        return "\n".join(lines) or "Метрик пока нет"
+
+    def _counters_by_name(self) -> dict[str, list[tuple[Labels, float]]]:
+        result = {}
+        for (name, labels), count in self.counters.items():
+            result.setdefault(name, []).append((labels, count))
+        return result
+
+    def _histograms_by_name(self) -> dict[str, list[tuple[Labels, Histogram]]]:
+        result = {}
+        for (name, labels), histogram in self.histograms.items():
+            result.setdefault(name, []).append((labels, histogram))
+        return result
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+metrics = Metrics()
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    # Registered as an inner middleware, so it only sees updates that reached a handler
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any]
+    ) -> Any:
+        name = data["handler"].callback.__name__
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.inc("handler_errors_total", handler=name)
+            raise
+        finally:
+            metrics.observe("handler_seconds", time.perf_counter() - start, handler=name)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Response:
+        name = type(method).__name__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            metrics.inc("telegram_errors_total", method=name, error=type(e).__name__)
+            raise
+        finally:
+            metrics.observe("telegram_request_seconds", time.perf_counter() - start, method=name)
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(), content_type="text/plain")
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
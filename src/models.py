@@ -2,7 +2,7 @@ from dataclasses import dataclass, field
 from typing import Callable
 
 
-@dataclass
+@dataclass(slots=True)
 class Team:
     id: str
     name: str
@@ -13,12 +13,13 @@ class Team:
     choice_2: str | None = None
 
     quiz_answers: list[str] = field(default_factory=list)
+    quiz_correct: int = 0 # graded as the answers arrive
 
     @property
     def total_score(self):
         return self.asset_1 + self.asset_2
 
-@dataclass
+@dataclass(slots=True)
 class Game:
     round: int = 0
     started: bool = False
@@ -26,7 +27,7 @@ class Game:
     quiz_started: bool = False
     history: dict[str, dict[str, tuple[int, int]]] = field(default_factory=dict) # position: round: (N, earn)
 
-@dataclass
+@dataclass(slots=True)
 class RoundPosition:
     name: str
     id: str
@@ -35,32 +36,10 @@ class RoundPosition:
     coefficient_from_mother: str | None = None # mother id
     custom_coefficient: bool | None = None
 
-    custom_coefficient_value: float | None = None
-
-    def get_coefficient(self, teams: list[Team]) -> float | None:
-        if self.linear_coefficient is not None:
-            return round(self.linear_coefficient(self.get_invests_by_id(self.id, teams)), 2)
-        if self.nonlinear_coefficients is not None:
-            invests = self.get_invests_by_id(self.id, teams)
-            for period, coefficient in self.nonlinear_coefficients.items():
-                if (invests >= period[0] and period[1] is None) or period[0] <= invests <= period[1]:
-                    return coefficient
-        if self.coefficient_from_mother is not None:
-            invest_count = self.get_invests_by_id(self.id, teams)
-            if not invest_count:
-                return 1
-            return round((self.get_invests_by_id(self.coefficient_from_mother, teams)
-                    / invest_count) or 1, 2)
-        if self.custom_coefficient is not None:
-            return self.custom_coefficient_value
-        return None
-
-    @staticmethod
-    def get_invests_by_id(pos_id: str, teams: list[Team]) -> int:
-        total = 0
-        for team in teams:
-            if team.choice_1 == pos_id:
-                total += 1
-            if team.choice_2 == pos_id:
-                total += 1
-        return total
\ No newline at end of file
+@dataclass(slots=True)
+class GameConfig:
+    id: str # part of the QR code links, letters, digits and "_"
+    admin_ids: list[int]
+    sheet_url: str | None
+    db_path: str
+    rounds: list[list[RoundPosition]]
@@ -0,0 +1,127 @@
+import asyncio
+import io
+import multiprocessing
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncGenerator, AsyncIterator, TYPE_CHECKING
+
+from aiogram import Bot
+from aiogram.types import InputFile
+
+# PIL, qrcode and zipfile are only imported once /qrs is used, they are not needed to start the bot
+if TYPE_CHECKING:
+    import zipfile
+    from PIL import Image
+
+QR_TEMPLATE_PATH = "qr_template.png"
+QR_FORMATS = ("jpeg", "png")
+ARCHIVE_MAX_SIZE = 45 * 1024 * 1024 # Telegram bots can upload documents up to 50 MB
+BATCH_SIZE = 64
+
+_template: "Image.Image | None" = None
+
+
+def _init_worker(template_path: str) -> None:
+    from PIL import Image
+
+    global _template
+    _template = Image.open(template_path)
+    _template.load()
+
+def render_qr(link: str, image_format: str = "jpeg", quality: int = 90) -> bytes:
+    from qrcode import ERROR_CORRECT_L
+    from qrcode.main import QRCode
+
+    if _template is None:
+        _init_worker(QR_TEMPLATE_PATH)
+    qr_data = QRCode(
+        error_correction=ERROR_CORRECT_L,
+        box_size=10,
+        border=0,
+    )
+    qr_data.add_data(link)
+    qr_data.make()
+    qr_code_img = qr_data.make_image(fill_color="white", back_color="#141414").resize((750, 750))
+    img = _template.copy()
+    img.paste(qr_code_img, (150, 650))
+    file = io.BytesIO()
+    if image_format == "jpeg":
+        img.convert("RGB").save(file, format="JPEG", quality=quality)
+    else:
+        img.save(file, format="PNG")
+    return file.getvalue()
+
+
+class QrRenderer:
+
+    def __init__(self, template_path: str = QR_TEMPLATE_PATH, workers: int | None = None):
+        self.template_path = template_path
+        self.workers = workers
+        self._pool: ProcessPoolExecutor | None = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Workers are not forked from the bot: a fork would copy its event loop, open sockets and the SQLite connection
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._pool = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context(method),
+                initializer=_init_worker,
+                initargs=(self.template_path,)
+            )
+        return self._pool
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    async def render_archives(
+            self,
+            codes: dict[str, str], # file name: link
+            image_format: str = "jpeg",
+            quality: int = 90,
+            max_size: int = ARCHIVE_MAX_SIZE
+    ) -> AsyncIterator[io.IOBase]:
+        # Archives are yielded as soon as the next image would not fit under max_size
+        loop = asyncio.get_running_loop()
+        items = list(codes.items())
+        archive, zf = self._new_archive()
+        for start in range(0, len(items), BATCH_SIZE):
+            batch = items[start:start + BATCH_SIZE]
+            images = await asyncio.gather(*(
+                loop.run_in_executor(self.pool, render_qr, link, image_format, quality)
+                for _, link in batch
+            ))
+            for (name, _), image in zip(batch, images):
+                if zf.filelist and archive.tell() + len(image) > max_size:
+                    zf.close()
+                    archive.seek(0)
+                    yield archive
+                    archive.close()
+                    archive, zf = self._new_archive()
+                zf.writestr(f"{name}.{image_format}", image)
+        zf.close()
+        archive.seek(0)
+        yield archive
+        archive.close()
+
+    @staticmethod
+    def _new_archive() -> tuple[tempfile.SpooledTemporaryFile, "zipfile.ZipFile"]:
+        import zipfile
+
+        archive = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        return archive, zipfile.ZipFile(archive, "w")
+
+
+class ArchiveInputFile(InputFile):
+    # Uploads a yielded archive chunk by chunk, a 45 MB archive is not copied into memory first
+
+    def __init__(self, archive: io.IOBase, filename: str):
+        super().__init__(filename=filename)
+        self.archive = archive
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        while chunk := self.archive.read(self.chunk_size):
+            yield chunk
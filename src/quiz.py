@@ -0,0 +1,19 @@
+import re
+
+from src.config import QUIZ_QUESTIONS, QUIZ_BONUS_COEFFICIENTS
+
+_NOT_ALNUM = re.compile(r"[\W_]+")
+
+
+def normalize_answer(answer: str) -> str:
+    # "nVidia!", " Nvidia " and "НВИДИЯ" are compared as "nvidia" and "нвидия"
+    return _NOT_ALNUM.sub("", answer.casefold()).replace("ё", "е")
+
+ACCEPTED_ANSWERS = [frozenset(map(normalize_answer, answers)) for _, answers in QUIZ_QUESTIONS]
+
+
+def is_correct(question: int, answer: str) -> bool:
+    return normalize_answer(answer) in ACCEPTED_ANSWERS[question]
+
+def bonus_coefficient(correct_answers: int) -> float:
+    return QUIZ_BONUS_COEFFICIENTS[correct_answers-1] if correct_answers > 0 else 1
@@ -0,0 +1,41 @@
+from typing import Iterable, Iterator, ValuesView
+
+from src.leaderboard import Leaderboard
+from src.models import Team
+
+
+class TeamRegistry:
+    # Teams are indexed both by Telegram owner id and by team id, the indexes are only changed together
+
+    def __init__(self, teams: Iterable[Team] = ()):
+        self._by_owner: dict[int, Team] = {}
+        self._by_id: dict[str, Team] = {}
+        self.leaderboard = Leaderboard()
+        for team in teams:
+            self.add(team)
+
+    def add(self, team: Team) -> None:
+        self._by_owner[team.owner_id] = team
+        self._by_id[team.id.lower()] = team
+        self.leaderboard.add(team)
+
+    def by_owner(self, owner_id: int) -> Team | None:
+        return self._by_owner.get(owner_id)
+
+    def by_id(self, team_id: str) -> Team | None:
+        return self._by_id.get(team_id.lower())
+
+    def owner_ids(self) -> list[int]:
+        return list(self._by_owner)
+
+    def values(self) -> ValuesView[Team]:
+        return self._by_owner.values()
+
+    def __contains__(self, owner_id: int) -> bool:
+        return owner_id in self._by_owner
+
+    def __iter__(self) -> Iterator[Team]:
+        return iter(self._by_owner.values())
+
+    def __len__(self) -> int:
+        return len(self._by_owner)
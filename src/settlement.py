@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+from typing import Iterable
+
+from src.coefficients import round_coefficients
+from src.models import Team, RoundPosition
+from src.table import TeamTable, POSITION_IDS, POSITION_INDEX, NO_CHOICE
+
+
+@dataclass
+class TeamResult:
+    team: Team
+    old_asset_1: float
+    old_asset_2: float
+    coef_1: float = 1
+    coef_2: float = 1
+
+
+@dataclass
+class RoundSettlement:
+    invests: dict[str, int]
+    coefficients: dict[str, float | None]
+    invested: dict[str, float] # position id: assets put into it before the round
+    results: list[TeamResult]
+
+
+def settle_round(teams: Iterable[Team], positions: list[RoundPosition], custom_coefficient: float | None = None) -> RoundSettlement:
+    table = TeamTable(teams)
+    counts = table.count_invests()
+    coefficients = round_coefficients(positions, counts, custom_coefficient)
+    factors = [1.0] * len(POSITION_IDS)
+    for position, coefficient in zip(positions, coefficients):
+        index = POSITION_INDEX[position.id]
+        if counts[index]:
+            factors[index] = round(coefficient, 2)
+    results = []
+    invested = [0.0] * len(POSITION_IDS)
+    for i, (choice_1, choice_2) in enumerate(zip(table.choice_1, table.choice_2)):
+        result = TeamResult(table.teams[i], table.asset_1[i], table.asset_2[i])
+        if choice_1 != NO_CHOICE:
+            result.coef_1 = factors[choice_1]
+            invested[choice_1] += result.old_asset_1
+        if choice_2 != NO_CHOICE:
+            result.coef_2 = factors[choice_2]
+            invested[choice_2] += result.old_asset_2
+        table.asset_1[i] = round(result.old_asset_1 * result.coef_1, 2)
+        table.asset_2[i] = round(result.old_asset_2 * result.coef_2, 2)
+        results.append(result)
+    table.store()
+    return RoundSettlement(
+        {pos.id: counts[POSITION_INDEX[pos.id]] for pos in positions},
+        {pos.id: coefficient for pos, coefficient in zip(positions, coefficients)},
+        {pos.id: round(invested[POSITION_INDEX[pos.id]], 2) for pos in positions},
+        results
+    )
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+from contextlib import suppress
+from typing import Callable, Iterable, TYPE_CHECKING
+
+from src.config import ALL_POSITIONS
+from src.metrics import metrics
+from src.models import Team
+
+# gspread and google-auth are imported by the worker on its first write, not while the bot starts
+if TYPE_CHECKING:
+    from gspread_asyncio import AsyncioGspreadClientManager, AsyncioGspreadSpreadsheet, AsyncioGspreadWorksheet
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_HEADER = ["Место", "Имя", "Сумма", "ID"]
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+
+
+def service_account_manager(creds_path: str, requests_per_minute: int = 60) -> "AsyncioGspreadClientManager":
+    from google.oauth2.service_account import Credentials
+    from src.sheets_client import SheetsClientManager
+
+    return SheetsClientManager(lambda: Credentials.from_service_account_file(creds_path).with_scopes(SCOPES), budget=requests_per_minute)
+
+
+def leaderboard_rows(ranked_teams: Iterable[Team]) -> list[list]:
+    rows = [LEADERBOARD_HEADER]
+    for i, team in enumerate(ranked_teams, 1):
+        rows.append([i, team.name, team.total_score, team.id])
+    return rows
+
+def position_cells(history: dict[str, dict[str, tuple]]) -> dict[tuple[int, int], str]:
+    cells = {}
+    for i, position in enumerate(ALL_POSITIONS):
+        position_history = history.get(position.id, None)
+        if not position_history:
+            continue
+        for round, round_data in position_history.items():
+            cells[(4*i + 1 + 2, int(round) + 1)] = str(round_data[0])
+            cells[(4*i + 1 + 3, int(round) + 1)] = str(round_data[1])
+    return cells
+
+def changed_ranges(old: list[list], new: list[list]) -> list[dict]:
+    from gspread.utils import rowcol_to_a1
+
+    # Consecutive changed rows are merged into one A1 range, removed rows are blanked
+    width = len(LEADERBOARD_HEADER)
+    new = new + [[""] * width] * (len(old) - len(new))
+    ranges = []
+    start = None
+    for i in range(len(new) + 1):
+        changed = i < len(new) and (i >= len(old) or old[i] != new[i])
+        if changed and start is None:
+            start = i
+        elif not changed and start is not None:
+            ranges.append({
+                "range": f"{rowcol_to_a1(start + 1, 1)}:{rowcol_to_a1(i, width)}",
+                "values": new[start:i]
+            })
+            start = None
+    return ranges
+
+
+class SheetsSync:
+    # Handlers only mark the state dirty, the worker writes the difference after a debounce window
+
+    def __init__(
+            self,
+            make_agcm: Callable[[], "AsyncioGspreadClientManager"],
+            sheet_url: str,
+            get_ranked_teams: Callable[[], Iterable[Team]],
+            get_position_cells: Callable[[], dict[tuple[int, int], str]],
+            debounce: float = 3
+    ):
+        self.make_agcm = make_agcm
+        self.sheet_url = sheet_url
+        self.get_ranked_teams = get_ranked_teams
+        self.get_position_cells = get_position_cells
+        self.debounce = debounce
+        self._spreadsheet: "AsyncioGspreadSpreadsheet | None" = None
+        self._worksheets: dict[int, "AsyncioGspreadWorksheet"] = {}
+        self._leaderboard: list[list] | None = None
+        self._positions: dict[tuple[int, int], str] = {}
+        self._positions_dirty = False
+        self._dirty = asyncio.Event()
+        self._urgent = asyncio.Event() # the next write skips the debounce
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            # A write cut short by the cancel puts the flags back, they are checked once it has
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._dirty.is_set():
+            await self.flush()
+
+    def mark_dirty(self, positions: bool = False) -> None:
+        self._positions_dirty |= positions
+        self._dirty.set()
+
+    def flush_soon(self, positions: bool = False) -> None:
+        # Round end: the worker writes without waiting out the debounce, the caller does not wait for the write
+        self._urgent.set()
+        self.mark_dirty(positions)
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty.is_set()
+
+    async def flush(self) -> bool:
+        # Failures stay out of the handlers: the state is left dirty and the worker writes it on the next pass
+        async with self._lock:
+            self._dirty.clear()
+            update_positions, self._positions_dirty = self._positions_dirty, False
+            written = False
+            try:
+                with metrics.timer("sheets_sync_seconds"):
+                    await self._write_leaderboard()
+                    if update_positions:
+                        await self._write_positions()
+                written = True
+            except Exception:
+                logger.exception("Google Sheets sync failed")
+                metrics.inc("sheets_errors_total")
+            finally:
+                # Also when the write is cancelled, what it did not finish is written by the next flush
+                if not written:
+                    self._positions_dirty |= update_positions
+                    self._dirty.set()
+            return written
+
+    async def _run(self) -> None:
+        while True:
+            await self._dirty.wait()
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._urgent.wait(), self.debounce)
+            self._urgent.clear()
+            await self.flush()
+
+    async def _get_worksheet(self, index: int) -> "AsyncioGspreadWorksheet":
+        if self._spreadsheet is None:
+            agc = await self.make_agcm().authorize()
+            self._spreadsheet = await agc.open_by_url(self.sheet_url)
+        if index not in self._worksheets:
+            self._worksheets[index] = await self._spreadsheet.get_worksheet(index)
+        return self._worksheets[index]
+
+    async def _write_leaderboard(self) -> None:
+        rows = leaderboard_rows(self.get_ranked_teams())
+        sheet = await self._get_worksheet(0)
+        if self._leaderboard is None:
+            await sheet.clear()
+            ranges = changed_ranges([], rows)
+        else:
+            ranges = changed_ranges(self._leaderboard, rows)
+        if ranges:
+            await sheet.batch_update(ranges)
+        self._leaderboard = rows
+
+    async def _write_positions(self) -> None:
+        from gspread import Cell
+
+        cells = self.get_position_cells()
+        changed = [Cell(row, col, value) for (row, col), value in cells.items() if self._positions.get((row, col)) != value]
+        if changed:
+            sheet = await self._get_worksheet(1)
+            await sheet.update_cells(changed)
+        self._positions = cells
@@ -0,0 +1,95 @@
+import asyncio
+import copy
+import functools
+import logging
+import random
+import time
+from collections import deque
+
+from gspread.exceptions import APIError
+from gspread_asyncio import AsyncioGspreadClientManager
+from requests import RequestException
+
+from src.metrics import metrics
+
+# Imported by service_account_manager on the first Sheets write, gspread must not load while the bot starts
+
+logger = logging.getLogger(__name__)
+
+
+class SheetsClientManager(AsyncioGspreadClientManager):
+    # One per process, so all games share the authorized session and the per-minute quota of the service account.
+    # gspread_asyncio retries a failed call forever with a fixed delay, here 429, 5xx and network errors are retried
+    # with exponential backoff and jitter, then raised to the caller
+
+    def __init__(
+            self,
+            credentials_fn,
+            budget: int = 60,
+            budget_window: float = 60,
+            max_retries: int = 5,
+            backoff: float = 1,
+            max_backoff: float = 32
+    ):
+        super().__init__(credentials_fn, gspread_delay=0)
+        self.budget = budget # requests in any budget_window seconds
+        self.budget_window = budget_window
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.paused_until = 0.0
+        self._sent: deque[float] = deque() # times of the requests inside the window
+        self._attempts: dict[asyncio.Task, int] = {} # failed attempts of the call a task is waiting for
+
+    async def _call(self, method, *args, **kwargs):
+        # Worksheet.batch_update prefixes the ranges it is given with the sheet title in place,
+        # so every attempt gets its own copy of the arguments. The request is counted in the window from the time
+        # it completes, Google counts it from some time in between
+        @functools.wraps(method)
+        def attempt(*args, **kwargs):
+            try:
+                return method(*copy.deepcopy(args), **copy.deepcopy(kwargs))
+            finally:
+                self._sent[-1] = time.monotonic()
+
+        task = asyncio.current_task()
+        try:
+            return await super()._call(attempt, *args, **kwargs)
+        finally:
+            self._attempts.pop(task, None)
+
+    async def delay(self):
+        # Called under the call lock before every request, a burst is sent at once until the budget runs out
+        while True:
+            now = time.monotonic()
+            while self._sent and now - self._sent[0] >= self.budget_window:
+                self._sent.popleft()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+            elif len(self._sent) >= self.budget:
+                metrics.inc("sheets_throttled_total")
+                await asyncio.sleep(self._sent[0] + self.budget_window - now)
+            else:
+                break
+        self._sent.append(now)
+        metrics.inc("sheets_requests_total")
+
+    async def handle_gspread_error(self, e: APIError, method, args, kwargs):
+        retry_after = e.response.headers.get("Retry-After")
+        await self._retry(e, method, float(retry_after) if retry_after and retry_after.isdigit() else None)
+
+    async def handle_requests_error(self, e: RequestException, method, args, kwargs):
+        await self._retry(e, method)
+
+    async def _retry(self, e: Exception, method, retry_after: float | None = None) -> None:
+        task = asyncio.current_task()
+        attempt = self._attempts.get(task, 0)
+        if attempt >= self.max_retries:
+            raise e
+        self._attempts[task] = attempt + 1
+        metrics.inc("sheets_retries_total")
+        # Full jitter, so games that failed together do not retry together
+        delay = retry_after or random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        logger.warning("Google Sheets %s failed (%s), retry %d in %.1f s", method.__name__, e, attempt + 1, delay)
+        # The next call of any game waits too, the quota is shared
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
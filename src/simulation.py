@@ -0,0 +1,240 @@
+import argparse
+import itertools
+import math
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Callable
+
+from src.coefficients import CompiledPosition, compile_position
+from src.config import ROUNDS
+from src.models import RoundPosition
+from src.table import POSITION_IDS
+
+# Offline what-if runs of the round rules: synthetic games with scripted teams, no Telegram and no database.
+# Coefficients come from the same compiled tables the bot settles rounds with.
+# python -m src.simulation --games 100000 --scale sibur=0.8,1,1.2 --scale crypto=0.5,1
+
+CHUNK_SIZE = 2_000 # games per worker task
+SCORE_BUCKETS_PER_DOUBLING = 64 # precision of the score quantiles
+
+LastRound = dict[str, tuple[int, float]] # position id: investors, coefficient of the previous round
+Strategy = Callable[[random.Random, list[str], LastRound], int] # index of the chosen position
+
+
+def random_strategy(rnd: random.Random, pos_ids: list[str], last: LastRound) -> int:
+    return rnd.randrange(len(pos_ids))
+
+def greedy_strategy(rnd: random.Random, pos_ids: list[str], last: LastRound) -> int:
+    # The position that paid the most last round, as if nobody else reacts to it
+    known = [i for i, pos_id in enumerate(pos_ids) if pos_id in last]
+    if not known:
+        return rnd.randrange(len(pos_ids))
+    return max(known, key=lambda i: (last[pos_ids[i]][1], rnd.random()))
+
+def herd_strategy(rnd: random.Random, pos_ids: list[str], last: LastRound) -> int:
+    # Where most teams went last round
+    known = [i for i, pos_id in enumerate(pos_ids) if pos_id in last]
+    if not known:
+        return rnd.randrange(len(pos_ids))
+    return max(known, key=lambda i: (last[pos_ids[i]][0], rnd.random()))
+
+def contrarian_strategy(rnd: random.Random, pos_ids: list[str], last: LastRound) -> int:
+    # Where fewest teams went last round, new positions count as empty
+    return min(range(len(pos_ids)), key=lambda i: (last.get(pos_ids[i], (0, 0))[0], rnd.random()))
+
+STRATEGIES: dict[str, Strategy] = {
+    "random": random_strategy,
+    "greedy": greedy_strategy,
+    "herd": herd_strategy,
+    "contrarian": contrarian_strategy,
+}
+
+
+def _scaled(linear: Callable[[int], float], factor: float) -> Callable[[int], float]:
+    return lambda n: linear(n) * factor
+
+def scale_positions(rounds: list[list[RoundPosition]], scales: dict[str, float]) -> list[list[RoundPosition]]:
+    # Copies of the positions with linear and band coefficients multiplied, mother and custom ones stay as they are
+    scaled = {}
+    for position in {position.id: position for positions in rounds for position in positions}.values():
+        factor = scales.get(position.id, 1)
+        if factor == 1:
+            scaled[position.id] = position
+        elif position.linear_coefficient is not None:
+            scaled[position.id] = replace(position, linear_coefficient=_scaled(position.linear_coefficient, factor))
+        elif position.nonlinear_coefficients is not None:
+            scaled[position.id] = replace(position, nonlinear_coefficients={
+                band: coefficient * factor for band, coefficient in position.nonlinear_coefficients.items()
+            })
+        else:
+            scaled[position.id] = position
+    return [[scaled[position.id] for position in positions] for positions in rounds]
+
+
+@dataclass
+class StrategyStats:
+    teams: int = 0
+    wins: float = 0 # games where a team of the strategy finished first, shared on ties
+    total: float = 0
+    scores: Counter[int] = field(default_factory=Counter) # log bucket: teams
+
+    def add(self, score: float) -> None:
+        self.teams += 1
+        self.total += score
+        self.scores[score_bucket(score)] += 1
+
+    def merge(self, other: "StrategyStats") -> None:
+        self.teams += other.teams
+        self.wins += other.wins
+        self.total += other.total
+        self.scores.update(other.scores)
+
+    def quantile(self, q: float) -> float:
+        rank, seen = q * self.teams, 0
+        for bucket in sorted(self.scores):
+            seen += self.scores[bucket]
+            if seen >= rank:
+                return 2 ** (bucket / SCORE_BUCKETS_PER_DOUBLING)
+        return 0.0
+
+
+def score_bucket(score: float) -> int:
+    return math.floor(math.log2(max(score, 0.01)) * SCORE_BUCKETS_PER_DOUBLING)
+
+
+def play_game(
+        rnd: random.Random,
+        rounds: list[list[CompiledPosition]],
+        strategies: list[str],
+        custom_range: tuple[float, float]
+) -> list[float]:
+    # Same arithmetic as settle_round: coefficients rounded to 2 digits, assets rounded after every round
+    teams = len(strategies)
+    asset_1, asset_2 = [10.0] * teams, [10.0] * teams
+    pick = [STRATEGIES[name] for name in strategies]
+    last: LastRound = {}
+    for compiled in rounds:
+        pos_ids = [position.position.id for position in compiled]
+        indexes = [position.index for position in compiled]
+        choice_1 = [indexes[strategy(rnd, pos_ids, last)] for strategy in pick]
+        choice_2 = [indexes[strategy(rnd, pos_ids, last)] for strategy in pick]
+        counts = [0] * len(POSITION_IDS)
+        for choice in itertools.chain(choice_1, choice_2):
+            counts[choice] += 1
+        custom_coefficient = round(rnd.uniform(*custom_range), 2)
+        factors = [1.0] * len(POSITION_IDS)
+        last = {}
+        for position in compiled:
+            coefficient = position.coefficient(counts, custom_coefficient)
+            if counts[position.index]:
+                factors[position.index] = round(coefficient, 2)
+            last[position.position.id] = (counts[position.index], coefficient or 0)
+        for i in range(teams):
+            asset_1[i] = round(asset_1[i] * factors[choice_1[i]], 2)
+            asset_2[i] = round(asset_2[i] * factors[choice_2[i]], 2)
+    return [a + b for a, b in zip(asset_1, asset_2)]
+
+
+def _run_chunk(
+        scales: dict[str, float],
+        mix: dict[str, int],
+        games: int,
+        seed: int,
+        custom_range: tuple[float, float]
+) -> dict[str, StrategyStats]:
+    # Positions hold lambdas that cannot be pickled, so every worker compiles its own copy
+    rounds = [[compile_position(position) for position in positions] for positions in scale_positions(ROUNDS, scales)]
+    strategies = [name for name, count in mix.items() for _ in range(count)]
+    stats = {name: StrategyStats() for name in mix}
+    rnd = random.Random(seed)
+    for _ in range(games):
+        scores = play_game(rnd, rounds, strategies, custom_range)
+        best = max(scores)
+        winners = [name for name, score in zip(strategies, scores) if score == best]
+        for name, score in zip(strategies, scores):
+            stats[name].add(score)
+        for name in winners:
+            stats[name].wins += 1 / len(winners)
+    return stats
+
+
+def simulate(
+        games: int,
+        mix: dict[str, int],
+        scales: dict[str, float] | None = None,
+        custom_range: tuple[float, float] = (0, 5),
+        processes: int | None = None,
+        seed: int = 0
+) -> dict[str, StrategyStats]:
+    scales = scales or {}
+    chunks = [(i, min(CHUNK_SIZE, games - start)) for i, start in enumerate(range(0, games, CHUNK_SIZE))]
+    stats = {name: StrategyStats() for name in mix}
+    with ProcessPoolExecutor(processes) as pool:
+        futures = [pool.submit(_run_chunk, scales, mix, size, seed * 1_000_003 + i, custom_range) for i, size in chunks]
+        for future in futures:
+            for name, chunk_stats in future.result().items():
+                stats[name].merge(chunk_stats)
+    return stats
+
+
+def report(stats: dict[str, StrategyStats], games: int) -> str:
+    lines = [f"{'strategy':>12} {'teams':>10} {'mean':>10} {'p10':>9} {'p50':>9} {'p90':>9} {'win share':>10}"]
+    for name, strategy_stats in sorted(stats.items(), key=lambda item: -item[1].wins):
+        lines.append(
+            f"{name:>12} {strategy_stats.teams:>10} {strategy_stats.total / strategy_stats.teams:>10.1f}"
+            f" {strategy_stats.quantile(0.1):>9.1f} {strategy_stats.quantile(0.5):>9.1f} {strategy_stats.quantile(0.9):>9.1f}"
+            f" {strategy_stats.wins / games:>10.1%}"
+        )
+    dominant = max(stats, key=lambda name: stats[name].wins / stats[name].teams)
+    lines.append(f"dominant: {dominant}")
+    return "\n".join(lines)
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, count = part.partition("=")
+        if name not in STRATEGIES:
+            raise argparse.ArgumentTypeError(f"unknown strategy {name}, one of {', '.join(STRATEGIES)}")
+        mix[name] = positive_int(count or "1")
+    return mix
+
+def positive_int(value: str) -> int:
+    if not value.isdigit() or int(value) < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value}")
+    return int(value)
+
+def parse_scale(value: str) -> tuple[str, list[float]]:
+    pos_id, _, factors = value.partition("=")
+    if pos_id not in POSITION_IDS:
+        raise argparse.ArgumentTypeError(f"unknown position {pos_id}")
+    return pos_id, [float(factor) for factor in factors.split(",")]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="What-if simulation of the round coefficients")
+    parser.add_argument("--games", type=positive_int, default=10_000)
+    parser.add_argument("--mix", type=parse_mix, default="random=10,greedy=10,herd=10,contrarian=10",
+                        help="teams per strategy, e.g. random=10,greedy=5")
+    parser.add_argument("--scale", type=parse_scale, action="append", default=[],
+                        help="coefficient multipliers of a position to sweep, e.g. sibur=0.8,1,1.2")
+    parser.add_argument("--custom", type=float, nargs=2, default=(0, 5), help="range of the admin's NFT coefficient")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Every combination of the scales is a point of the grid
+    grid = [dict(zip((pos_id for pos_id, _ in args.scale), point)) for point in itertools.product(*(factors for _, factors in args.scale))]
+    for scales in grid:
+        start = time.perf_counter()
+        stats = simulate(args.games, args.mix, scales, tuple(args.custom), args.processes, args.seed)
+        elapsed = time.perf_counter() - start
+        title = ", ".join(f"{pos_id} x{factor:g}" for pos_id, factor in scales.items()) or "current coefficients"
+        print(f"\n{title}: {args.games} games in {elapsed:.1f} s")
+        print(report(stats, args.games))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+from array import array
+from typing import Iterable
+
+from src.config import ALL_POSITIONS
+from src.models import Team
+
+POSITION_IDS = [position.id for position in ALL_POSITIONS]
+POSITION_INDEX = {pos_id: i for i, pos_id in enumerate(POSITION_IDS)} # position id => small int
+NO_CHOICE = -1
+
+
+class TeamTable:
+    # Columnar snapshot of the teams: row i of every array belongs to teams[i]
+
+    __slots__ = ("teams", "asset_1", "asset_2", "choice_1", "choice_2")
+
+    def __init__(self, teams: Iterable[Team]):
+        self.teams = list(teams)
+        self.asset_1 = array("d", [team.asset_1 for team in self.teams])
+        self.asset_2 = array("d", [team.asset_2 for team in self.teams])
+        self.choice_1 = array("b", [POSITION_INDEX.get(team.choice_1, NO_CHOICE) for team in self.teams])
+        self.choice_2 = array("b", [POSITION_INDEX.get(team.choice_2, NO_CHOICE) for team in self.teams])
+
+    def __len__(self) -> int:
+        return len(self.teams)
+
+    def count_invests(self) -> list[int]:
+        counts = [0] * len(POSITION_IDS)
+        for choices in self.choice_1, self.choice_2:
+            for choice in choices:
+                if choice != NO_CHOICE:
+                    counts[choice] += 1
+        return counts
+
+    def store(self) -> None:
+        for team, asset_1, asset_2 in zip(self.teams, self.asset_1, self.asset_2):
+            team.asset_1, team.asset_2 = asset_1, asset_2
@@ -0,0 +1,59 @@
+import asyncio
+import signal
+from contextlib import suppress
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+
+class WebhookHandler(SimpleRequestHandler):
+    # Telegram gets an answer right away, at most `concurrency` updates are processed at the same time
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: str | None = None, concurrency: int = 100):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token)
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _background_feed_update(self, bot: Bot, update: dict[str, Any]) -> None:
+        async with self._semaphore:
+            await super()._background_feed_update(bot, update)
+
+    async def close(self) -> None:
+        # Updates that were already accepted are finished before the bot session is closed
+        if self._background_feed_update_tasks:
+            await asyncio.wait(set(self._background_feed_update_tasks))
+        await super().close()
+
+
+def create_app(dispatcher: Dispatcher, bot: Bot, path: str, secret_token: str | None = None, concurrency: int = 100) -> web.Application:
+    app = web.Application()
+    WebhookHandler(dispatcher, bot, secret_token, concurrency).register(app, path=path)
+    setup_application(app, dispatcher, bot=bot)
+    return app
+
+async def run_webhook(
+        dispatcher: Dispatcher,
+        bot: Bot,
+        host: str,
+        port: int,
+        path: str,
+        secret_token: str | None = None,
+        concurrency: int = 100,
+        url: str | None = None,
+        stop: asyncio.Event | None = None
+) -> None:
+    stop = stop or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in signal.SIGINT, signal.SIGTERM:
+        with suppress(NotImplementedError, RuntimeError):
+            loop.add_signal_handler(sig, stop.set)
+    runner = web.AppRunner(create_app(dispatcher, bot, path, secret_token, concurrency))
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+        if url:
+            await bot.set_webhook(url.rstrip("/") + path, secret_token=secret_token, allowed_updates=dispatcher.resolve_used_update_types())
+        await stop.wait()
+    finally:
+        await runner.cleanup()